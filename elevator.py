@@ -7,9 +7,20 @@
 ##########################################################
  
 # Import standard python libraries
+import os
 import sys
 import time
-import select
+
+import liftgpio
+import liftloop
+import liftctl
+import liftstats
+import liftstate
+import liftdebounce
+import liftboard
+import liftjournal
+import liftserver
+import liftpark
 
 ##############################################################
 # GPIO Pin definitions for Lift Simulation Board 
@@ -110,213 +121,121 @@ lift_buttons = [
 NO_OF_FLOORS	  =	4		# No of floors for Lift Simulation Operation
 NO_OF_DIR_LEDS	  =	7		# No of LEDs used for the lift direction (on Board)
 DEFAULT_LIFT_POS =	0		# The floor no where lift is positioned when program is executed
+DISPATCH_POLICY  =	"look"		# Order in which pending calls are served: "fcfs", "look" or "nearest"
+GPIO_BACKEND	 =	"sysfs"		# GPIO interface used: "sysfs", "chardev" or "fake" (no board)
+STATS_FILE	 =	"/tmp/lift.stats"	# Latency histograms and GPIO counters, rewritten every STATS_PERIOD
+STATS_SOCKET	 =	"/tmp/lift.sock"	# Unix socket sending the same statistics to every client
+STATS_PERIOD	 =	10		# Seconds between two rewrites of STATS_FILE
+KEEP_EXPORTED	 =	True		# Leave the PINs exported on exit, for a fast restart
+STATE_FILE	 =	"/var/tmp/lift.state"	# Floor, direction and pending calls, restored after a crash or restart
+BOARD_FILE	 =	"/etc/lift/board.json"	# Board layout and timings (JSON); the built-in layout if missing
+JOURNAL_DIR	 =	"/var/tmp/lift.journal"	# Binary journal of all lift events and LED changes (see liftjournal)
+CONTROL_SOCKET	 =	"/tmp/lift.ctl"	# Unix socket to place calls and stream the lift state (see liftserver)
+PARK_TIME	 =	30		# Seconds idle before the lift parks where calls are likely (None: never)
+
+
+# Built-in layout of the board; BOARD_FILE overrides any part of it (see liftboard)
+BOARD_DEFAULTS = {
+	"dir_leds":		dir_leds,
+	"pos_leds":		pos_leds,
+	"lift_leds":		lift_leds,
+	"buttons":		lift_buttons,
+	"default_floor":	DEFAULT_LIFT_POS,
+}
+             
+################################################################################
+# Description	: LED frame engine.
+#		  Keeps a shadow copy of the state ("0"/"1") of every lift LED,
+#		  keyed by GPIO PIN (in the form of string). A frame is a dict
+#		  {gpio: "0"/"1"} describing the wanted state of some or all of
+#		  the LEDs; commit() writes only the PINs whose state differs
+#		  from the shadow, in one writeMany() call of the GPIO backend,
+#		  so a frame change shows up at once instead of rippling across
+#		  the board.
+# Note		: A PIN whose state is unknown (None) is always written.
+#		  Every PIN written is recorded in "journal" (a liftjournal.Journal),
+#		  if set.
+#		  LED writes must go through the engine (liftLEDOn/liftLEDOff
+#		  do) or the shadow copy gets out of step with the board.
+################################################################################
+class LedFrameEngine(object):
 
+	def __init__(self, backend, gpios):
+		self.backend = backend					# liftgpio backend the LEDs are written with
+		self.shadow = dict((gpio, None) for gpio in gpios)
+		self.journal = None
 
-# Array associated with each floor having 4 elements; each again having 3 elements fd, button and led
-floor_set = [
-		{"fd":-1, "button":LIFT_BUTTON_0, "led":LIFT_LED_0},		# fd, Button and LED for 0th (Ground) Floor
-		{"fd":-1, "button":LIFT_BUTTON_1, "led":LIFT_LED_1},		# fd, Button and LED for 1st Floor
-		{"fd":-1, "button":LIFT_BUTTON_2, "led":LIFT_LED_2},		# fd, Button and LED for 2nd Floor        
-		{"fd":-1, "button":LIFT_BUTTON_3, "led":LIFT_LED_3}		# fd, Button and LED for 3rd Floor
+	# Set the shadow state of PINs without writing them (e.g. after liftInitAll)
+	def reset(self, gpios, val):
+		for gpio in gpios:
+			self.shadow[gpio] = val
+		return
 
-             ]
-             
-# PATH of a GPIO specific sysfs interfce directory on Linux system             
-SYSFS_GPIO_DIR = "/sys/class/gpio"
+	# Write the PINs of frame that changed; Return : number of PINs written
+	def commit(self, frame):
+		changed = [(gpio, val) for gpio, val in frame.items() if self.shadow.get(gpio) != val]
+		if changed:
+			self.backend.writeMany(changed)
+			for gpio, val in changed:
+				self.shadow[gpio] = val
+			if self.journal is not None:
+				for gpio, val in changed:
+					self.journal.led(gpio, val)
+		return len(changed)
 
 
-             	
 ################################################################################
-# Description 	: Write the GPIO PIN value on "/sys/class/gpio/export" file.
-# 		 This will export (make visible) the directory associated
-#		 with particular GPIO pin under sysfs interface.
-#		 e.g. if value of GPIO PIN is "23" then "/sys/class/gpio/gpio23"
-#		 directory will be exported (will become visible)
-# Input   	: @gpio = Value of GPIO PIN (in the form of string)
-# Return	: None
-# Note		: Must be called for a particular GPIO PIN before using that PIN.
+# Description	: Build the batch of frames for the direction LED chase.
+#		  Frame i glows the first i+1 LEDs of "order", each frame is held
+#		  for "hold" seconds and a last frame turns all of them OFF.
+# Input		: @order = direction LED PINs (strings) in the order they glow
+#		  @hold  = seconds each step of the chase is kept
+# Return	: List of (frame, hold) pairs (see liftctl.LedOutputs.chase())
 ################################################################################
-def gpioExport (gpio): 
-	try:
-   		fo = open(SYSFS_GPIO_DIR + "/export","w")  			
-   		fo.write(gpio)
-   		fo.close()
-   		return
-   	except IOError:
-                return
-
-#################################################################################
-# Description : Exactly opposite of export() function above.
-# 		 Write the GPIO PIN value on "/sys/class/gpio/unexport" file.
-# 		 This will un-export (make invisible) the directory associated
-#		 with particular GPIO pin under sysfs interface.
-#		 e.g. if value of GPIO PIN is "23" then "/sys/class/gpio/gpio23"
-#		 directory will be unexported (will become invisible)
-# Input	: @gpio = Value of GPIO PIN (in the form of string)
-# Return	: None
-# Note		: Must be called for a particular GPIO PIN after it is used
-# 		  This makes a PIN free from GPIO functionality
-#################################################################################
-def gpioUnexport (gpio):
-	try: 
-   		fo = open(SYSFS_GPIO_DIR + "/unexport","w")  
-   		fo.write(gpio)
-   		fo.close()
-   		return
-   	except IOError:
- 		return
-
-
-################################################################################################
-# Description : Write the direction ("in"/"out") on "/sys/class/gpio/gpioN/direction"
-#               where "gpioN" stands for the directory already exported.
-# 		 This will configure a particular GPIO PIN as an input or output pin.
-# Input	: @gpio = Value of GPIO PIN (in the form of string)
-# 		  @flag  = Value of direction either "in" or "out"
-# Return	: None
-# Note		: Make sure to export a GPIO PIN (using gpioExport) before calling this function
-#################################################################################################
-
-def gpioSetDir (gpio, flag):
-	try: 
-	   	fo = open(SYSFS_GPIO_DIR + "/gpio" + gpio + "/direction" ,"w")  
-	   	fo.write(flag)
-	   	fo.close()
-	   	return
- 	except IOError:
-                return
-
-################################################################################################
-# Description  : Write the value ("0"/"1") on "/sys/class/gpio/gpioN/value"
-#                where "gpioN" stands for the directory already exported.
-# 		  This will make particular GPIO PIN as LOW or HIGH (CLEAR or SET).
-# Input   	: @gpio = Value of GPIO PIN (in the form of string)
-# 		  @val  = Value of GPIO either "0" or "1"
-# Return	: None
-# Note		: Make sure to export a GPIO PIN (using gpioExport) and
-# 		  set the direction as "out" (using gpioSetDir) before calling this function
-#################################################################################################
-
-def gpioSetVal (gpio, val):
-	try: 
-		fo = open(SYSFS_GPIO_DIR + "/gpio" + gpio + "/value" ,"w")  
-		fo.write(val)
-		fo.close()
-		return
-	except IOError:
-                return
-
-
-################################################################################################
-# Description  : Write the Edge value on "/sys/class/gpio/gpioN/edge"
-#                where "gpioN" stands for the directory already exported.
-# 		 This will set the GPIO edge value.
-# 		 Edge can be set to any of the 4 values
-# 			"falling"	"rising" 	"both"		"none"
-# Input		: @gpio = Value of GPIO PIN (in the form of string)
-#		  @flag  = Value of GPIO edge
-# Return	: None
-# Note		: Make sure to export a GPIO PIN (using gpioExport) before calling this function
-#################################################################################################
-
-def gpioSetEdge (gpio, flag): 
-	try:
-		fo = open(SYSFS_GPIO_DIR + "/gpio" + gpio + "/edge" ,"w")  
-		fo.write(flag)
-		fo.close()
-   		return
-	except IOError:
-                return
-
-#################################################################################
-# Description  : Function to clean up a particular liftLED
-#		  Means Clear the LED and unexport the GPIO PIN
-# Input        : @gpio = Value of GPIO PIN (in the form of string)
-# Return       : None
-# Note	       : This function is called for every LED on lift simulation board
-#################################################################################
-def liftLEDExit (gpio):
-	gpioSetVal(gpio, val="0")
-	gpioUnexport(gpio)
-	return 
-
-
-###################################################################################
-# Description  : Function to initialize a particular liftLED
-#		 Means export the GPIO PIN for LED, Set its direction as "out"
-#		 and Clear the LED (Make it "OFF").
-#		 Initially we keep all the LEDs in OFF status.
-# Input 	: @gpio = Value of GPIO PIN (in the form of string)
-# Return	: None
-# Note		: This function is called for every liftLED
-###################################################################################
-	
-def liftLEDInit (gpio):
-	gpioExport(gpio)
-	gpioSetDir(gpio, flag="out")
- 	gpioSetVal(gpio, val="0")
- 	return
+def liftDirBatch (order, hold):
+	batch = []
+	for i in range(len(order)):
+		frame = dict((gpio, "1" if j <= i else "0") for j, gpio in enumerate(order))
+		batch.append((frame, hold))
+	batch.append((dict((gpio, "0") for gpio in order), 0))
+	return batch
 
 
 ###################################################################################
 # Description  : Function to make a particular liftLED ON
 #		  Means make the LED "ON", by writing "1" to it's GPIO PIN
+#		  (through led_frames; nothing is written if it is already ON)
 # Input  	: @gpio = Value of GPIO PIN (in the form of string)
 # Return   	: None
-# Note		: Make sure to initialize a particular liftLED using
-# 		  liftLEDInit() before calling this function
+# Note		: Make sure to initialize all the liftLEDs using
+# 		  liftInitAll() before calling this function
 ###################################################################################
  	
 def liftLEDOn (gpio):
-	gpioSetVal(gpio, val="1")
+	led_frames.commit({gpio: "1"})
 	return 
 
 
 ###################################################################################
 # Description  : Function to make a particular liftLED OFF
 #		  Means make the LED "OFF", by writing "0" to it's GPIO PIN
+#		  (through led_frames; nothing is written if it is already OFF)
 # Input   	: @gpio = Value of GPIO PIN (in the form of string)
 # Return	: None
-# Note		: Make sure to initialize a particular liftLED using
-# 		  liftLEDInit() before calling this function
+# Note		: Make sure to initialize all the liftLEDs using
+# 		  liftInitAll() before calling this function
 #####################################################################################
 def liftLEDOff (gpio):
-	gpioSetVal(gpio, val="0")
+	led_frames.commit({gpio: "0"})
 	return 
 
-###############################################################################
-# Description  : Function to clean up a particular lift button
-#		 It will unexport the GPIO PIN associated with lift button
-# Input   	: @gpio = Value of GPIO PIN (in the form of string)
-# Return	: None
-# Note		: This function is called for every lift button.
-#################################################################################
-
-def liftButtonExit (gpio):
-	gpioUnexport(gpio)
-	return 
-	
-###################################################################################
-# Description  : Function to initialize a particular button
-#		 Means export the GPIO PIN for button, Set its direction as "in"
-#		 and set its edge as "falling".
-# Input   	: @gpio = Value of GPIO PIN (in the form of string)
-# Return	: None
-# Note		: This function is called for every lift button.
-#####################################################################################
-def liftButtonInit (gpio):
-	gpioExport(gpio)
-	gpioSetDir(gpio, flag="in")
- 	gpioSetEdge(gpio, flag="falling")
- 	return
-
-
-
 ###################################################################################
-# Description  : Initialize all the lift LEDs and BUTTONs one-by-one.
-#		 Observe that each time liftLEDInit() or liftButtonInit() is called,
-#		 LED/BUTTON value is converted from integer number to a string
-#		 and then it is passed as a parameter.
+# Description  : Initialize all the lift LEDs and BUTTONs.
+#		 The LEDs are set up as outputs and cleared (Made "OFF"),
+#		 the BUTTONs as inputs with "falling" edge, all at once
+#		 through the GPIO backend (gpio_backend). PINs left exported
+#		 by a previous run are only checked, not set up again.
+#		 LED/BUTTON values are converted from integer numbers to strings.
 # Input       	: None
 # Return	: None
 # Note		: This function should be called from the main() before starting
@@ -324,21 +243,18 @@ def liftButtonInit (gpio):
 #####################################################################################
 
 def liftInitAll():
-	for i in range(0, NO_OF_DIR_LEDS):
-		liftLEDInit(str(dir_leds[i]))
-			
-	for i in range(0, NO_OF_FLOORS):
-		liftLEDInit(str(pos_leds[i]))
-		liftLEDInit(str(lift_leds[i]))
-		liftButtonInit(str(lift_buttons[i]))
+	start = liftloop.monotonic()
+	gpio_backend.setup(board.leds, board.inputs, edge="falling")
+	led_frames.reset(board.leds, "0")
+	liftstats.record("board_init", liftloop.monotonic() - start)
 	return	
 
 
 ###################################################################################################
-# Description  : Cleanup all the lift LEDs and BUTTONs one-by-one.
-#		 Observe that each time liftLEDExit() or liftButtonExit is called,
-#		 LED/BUTTON is converted from integer number to a string and then
-#		 it is passed as a parameter.
+# Description  : Cleanup all the lift LEDs and BUTTONs.
+#		 Stops the button watcher, clears the LEDs and releases all the
+#		 PINs through the GPIO backend (gpio_backend). With KEEP_EXPORTED
+#		 the PINs stay exported and set up, so the next start is a warm one.
 # Input	: None
 # Return	: None
 # Note		: This function can be called,
@@ -347,155 +263,174 @@ def liftInitAll():
 # 				   LEDs, whenever CTRL+C is pressed (mostly from BBB shell prompt)
 ###################################################################################################
 def liftExitAll():
-	for i in range(0, NO_OF_DIR_LEDS):
-		liftLEDExit(str(dir_leds[i]))
-			
-	for i in range(0, NO_OF_FLOORS):
-		liftLEDExit(str(pos_leds[i]))
-		liftLEDExit(str(lift_leds[i]))
-		liftButtonExit(str(lift_buttons[i]))
+	button_watcher.stop()
+	if exporter is not None:
+		exporter.close()					# Last write of the statistics
+	if server is not None:
+		server.close()						# Disconnect the control clients
+	state.close()
+	led_frames.journal = None
+	journal.close()
+	gpio_backend.release(keep=KEEP_EXPORTED)
+	led_frames.reset(board.leds, None)
 	print "\n=== Demonstration END ===\n"
 	return	
 
 ###################################################################################
 # Description  : Set the default position of the lift,
-#		 by glowing the position LED defined by DEFAULT_LIFT_POS
-#		 (DEFAULT_LIFT_POS = 0th floor i.e. ground floor)
-# Input	: None
+#		 by glowing the position LED of the default floor of the board
+#		 (DEFAULT_LIFT_POS = 0th floor i.e. ground floor, unless BOARD_FILE
+#		 says otherwise), or the one of the floor restored from STATE_FILE
+# Input	: @floor = floor of the lift (default: the default floor)
 # Return	: None
 # Note		: This function must be called from main() after inititalization
 #####################################################################################
-def liftDefaultPos():
-	liftLEDOn(str(pos_leds[DEFAULT_LIFT_POS]))
+def liftDefaultPos(floor=None):
+	liftLEDOn(board.floor[board.default_floor if floor is None else floor].pos.gpio)
 	return 
 
 
-###################################################################################
-# Description  : Glow the direction LEDs in upward direction.
-#		 This indicates that lift is going to upper floor(s).
-# Input	: None
-# Return	: None
-# Note		: This function is used when lift is called from upper
-# 		  floor than the current position of the lift
-#####################################################################################
-def liftDirUp():
-	for i in range(0, NO_OF_DIR_LEDS):
-		liftLEDOn(str(dir_leds[i]))
-		time.sleep(0.5)
-	for i in range(0, NO_OF_DIR_LEDS):
-		liftLEDOff(str(dir_leds[i]))
-	return
+####################################################################################################
+# Description  : Long-lived watcher for the lift buttons.
+#		  open() gets an edge descriptor for every button of floor_set once
+#		  from the GPIO backend (for sysfs: the value file after a dummy
+#		  read(), watched for EPOLLPRI, the "exceptional condition" the old
+#		  select() call was waiting for). attach() registers the descriptors
+#		  as readers on a liftloop.EventLoop and calls callback(floor,
+#		  timestamp) for every press.
+#		  Every edge first goes through a liftdebounce.Debouncer: bounce, spikes
+#		  and presses for a floor which is already pending in the lift are
+#		  dropped.
+# Note		: stop() detaches from the loop, then lets the backend close the edge
+#		  descriptors; it is called from liftExitAll().
+####################################################################################################
+class ButtonWatcher(object):
+
+	def __init__(self, backend, floors, window=liftdebounce.DEBOUNCE_WINDOW):
+		self.backend = backend					# liftgpio backend the buttons are read with
+		self.floors = floors					# floor_set: liftboard.Floor records
+		self.debounce = liftdebounce.Debouncer(backend, window)
+		self.loop = None					# Event loop the buttons are attached to
+		self.callback = None
+		self.fd_floor = {}					# button fd -> floor number
+		self.fd_events = {}					# button fd -> epoll events to wait for
+
+	def open(self):
+		floor_of = dict((floor.button.gpio, floor.index) for floor in self.floors)
+		for fd, events, gpio in self.backend.edgeSources():
+			self.fd_floor[fd] = floor_of[gpio]
+			self.fd_events[fd] = events
+		return
+
+	# Input : @pending = function(floor) telling whether floor is already
+	#		    called, so that pressing it again is a no-op
+	def attach(self, loop, callback, pending=None):
+		if not self.fd_floor:
+			self.open()
+		self.loop = loop
+		self.callback = callback
+		self.debounce.pending = pending
+		for fd in self.fd_floor:
+			loop.addReader(fd, self._onEdge, self.fd_events[fd])
+		return
+
+	def _onEdge(self, fd, events):
+		stamp = self.loop.time()
+		gpio, level = self.backend.ackEdge(fd)			# Re-arm the edge notification
+		if self.debounce.accept(gpio, self.fd_floor[fd], stamp, level):
+			self.callback(self.fd_floor[fd], stamp)
+			liftstats.record("press_ack", self.loop.time() - stamp)	# LED of the call is lit by now
+		return
+
+	def stop(self):
+		if self.loop is not None:
+			for fd in self.fd_floor:
+				self.loop.removeReader(fd)
+			self.loop = None
+			self.callback = None
+		self.backend.closeEdges()
+		self.fd_floor = {}
+		self.fd_events = {}
+		return
 
 
 ###################################################################################
-# Description  : Glow the direction LEDs in downward direction.
-#		 This indicates that lift is going to lower floor(s).
-# Input   	: None
+# Description  : Simulated button presses for the "fake" GPIO backend.
+#		 Every floor number typed on stdin presses the button of that floor.
+# Input	: @fd     = stdin descriptor
+#		  @events = epoll events (unused)
 # Return	: None
-# Note		: This function is used when lift is called to lower
-# 		  floor than the current position of the lift
 #####################################################################################
-
-def liftDirDown():
-	for i in range(NO_OF_DIR_LEDS, 0, -1):
-		liftLEDOn(str(dir_leds[i-1]))
-		time.sleep(0.5)
-	for i in range(0, NO_OF_DIR_LEDS):
-		liftLEDOff(str(dir_leds[i]))
+def liftFakeInput (fd, events):
+	data = os.read(fd, 64)
+	if not data:
+		loop.removeReader(fd)					# stdin closed
+		return
+	for word in data.split():
+		if word.isdigit() and int(word) < NO_OF_FLOORS:
+			gpio_backend.press(floor_set[int(word)].button.gpio)
 	return
 
 
-####################################################################################################
-# Description  : This function actually returns the floor number at which lift button is pressed.
-# 		  It will prepare all the button FDs for select() call. As soon as select() returns; 
-#		  it will retrun a list of FDs (in ex), so traverse ex and check for each fd 
-# 		  if it present in ex list. If it is present then coresponding button is pressed 
-#		  and so glow the corresponding LED and return i as a return value.	
-# Input 	: None
-# Return	: Floor Number of lift where button is pressed
-####################################################################################################
-def GetButtonVal(): 
-	try:		
-		fo0 = open(SYSFS_GPIO_DIR + "/gpio" + str(LIFT_BUTTON_0) + "/value" ,"r") # Open and get file descriptor of button file of 0th floor 
-		fo0.read(2)								  # Make dummy read() call on it	
-		floor_set[0]["fd"] = fo0						  # store fd in 0th element of floor_set array	
-		
-		fo1 = open(SYSFS_GPIO_DIR + "/gpio" + str(LIFT_BUTTON_1) + "/value" ,"r") # Open and get file descriptor of button file of 1st floor
-		fo1.read(2)								  # Make dummy read() call on it   	
-		floor_set[1]["fd"] = fo1						  # store fd in 1st element of floor_set array
-		
-		fo2 = open(SYSFS_GPIO_DIR + "/gpio" + str(LIFT_BUTTON_2) + "/value" ,"r") # Open and get file descriptor of button file of 2nd floor
-		fo2.read(2)								  # Make dummy read() call on it	
-		floor_set[2]["fd"] = fo2						  # store fd in 2nd element of floor_set array	
-		
-		fo3 = open(SYSFS_GPIO_DIR + "/gpio" + str(LIFT_BUTTON_3) + "/value" ,"r") # Open and get file descriptor of button file of 3rd floor
-		fo3.read(2)								  # Make dummy read() call on it   	
-		floor_set[3]["fd"] = fo3						  # store fd in 3rd element of floor_set array
-		
-		print "\nWaiting for button press ..."
-		
-		# Call to select(). Program will block for input and it will return once button is pressed.
-		# We are passing three lists (read fds, write fds and exception fds) to select() function
-		# It will retrun three lists as r, w and ex respectively
-		# In this case first two lists are NULL, In third list fds associated with lift buttons are passed
-		# select() will retrun NULL in r & w and list of fds on which data is available in ex    
-		r, w, ex = select.select([], [], [fo0, fo1, fo2, fo3])			
-						
-		# Detect on which floor button is pressed						
-		for i in range(len(floor_set)):						# Run a loop for all (4) floors				
-			if floor_set[i]["fd"] in ex:					# Check current fd is present in ex (ex=list of fds on which data is available)  	
-				print "LIFT button is pressed for floor #%d" % i	# Print the floor no indicated by i
-				liftLEDOn(str(floor_set[i] ["led"]))			# Glow the corresponding LED for floor indicated by i to show button press event
-				time.sleep(1)						# Wait for 1 second
-				but = i							# Store value of i in but variable
-				fo = floor_set[i]["fd"]					# Get the current fd from array 	
-				fo.seek(0, 0);						# Call seek() so that fd will point at begining of the file
-				str1 = fo.read(1)					# Make dummy read() call on it 
-	
-		fo0.close()								# Close fd for 0th floor
-		fo1.close()								# Close fd for 1st floor
-		fo2.close()								# Close fd for 2nd floor
-		fo3.close()								# Close fd for 3rd floor
-		return but
-	
-	except IOError:
-                return
+# GPIO backend: first command line argument ("sysfs", "chardev" or "fake"), or GPIO_BACKEND
+gpio_backend = liftgpio.BACKENDS[sys.argv[1] if len(sys.argv) > 1 else GPIO_BACKEND]()
+
+# Board layout: second command line argument, or BOARD_FILE
+board = liftboard.loadBoard(sys.argv[2] if len(sys.argv) > 2 else BOARD_FILE, BOARD_DEFAULTS)
+NO_OF_FLOORS = board.floors
+NO_OF_DIR_LEDS = len(board.dir_leds)
+floor_set = board.floor								# Button, button press LED and position LED of each floor
+
+led_frames = LedFrameEngine(gpio_backend, board.leds)					# Shadow state of all lift LEDs
+dir_up_batch = liftDirBatch(board.dir_up, board.timing["chase_hold"])			# Direction chase, bottom to top
+dir_down_batch = liftDirBatch(board.dir_down, board.timing["chase_hold"])		# Direction chase, top to bottom
+button_watcher = ButtonWatcher(gpio_backend, floor_set, board.timing["debounce"])	# Watches the lift buttons for the whole program
+exporter = None												# Statistics exporter, once the loop runs
+server = None												# Control server, once the loop runs
+state = liftstate.StateStore(STATE_FILE)							# Crash-safe state of the lift
+journal = liftjournal.Journal(JOURNAL_DIR)							# Trace of every lift event
+led_frames.journal = journal
 
 
 try:
 	print "\nLift Operation Simulation using Python\n"
 	print  "-----------------------------------------------\n" 	
 	liftInitAll()							# Initialize all lift Buttons and LEDs	
-	liftDefaultPos()						# Set dafault position of the lift (0th floor)
-
-	cur_flr = DEFAULT_LIFT_POS					# Variable for current lift floor (initially 0)
-	
-	while True:
-		new_flr = GetButtonVal()		# Get a new floor value by detecting a floor no to which button user calls the lift
-		if new_flr > cur_flr:				# if (new floor > current floor) means lift is called to upper floor	
-			tmp = cur_flr						# store current floor no into tmp variable
-			print "LIFT going UP to floor #%d" %new_flr		# print destination floor
-			while (tmp != new_flr):					# Use tmp value (incremental); till it becomes destination
-				liftDirUp()					# Glow direction LEDs in upward direction
-				time.sleep(0.01)				# sleep for 10 ms
-				liftLEDOff(str(pos_leds[tmp]))			# Turn off position LED at the floor pointed by tmp
-				tmp += 1					# Increment tmp value by 1
-				liftLEDOn(str(pos_leds[tmp]))			# Turn ON position LED at the floor pointed by tmp. Lift is one floor UP
-				time.sleep(0.5)					# Sleep for 0.5 second (500 ms)
-		elif new_flr < cur_flr:				# if (new floor < current floor) means lift is called to lower floor
-			tmp = cur_flr						# store current floor no into tmp variable
-			print "LIFT going DOWN to floor #%d" %new_flr		# print destination floor
-			while (tmp != new_flr):					# Use tmp value (decremental); till it becomes destination
-				liftDirDown()					# Glow direction LEDs in downward direction
-				time.sleep(0.01)				# Sleep for 10 ms
-				liftLEDOff(str(pos_leds[tmp]))			# Turn off position LED at the floor pointed by tmp
-				tmp -= 1					# Decrement tmp value by 1
-				liftLEDOn(str(pos_leds[tmp]))			# Turn ON position LED at the floor pointed by tmp. Lift is one floor DOWN
-				time.sleep(0.5)					# sleep for 0.5 second (500 ms)	
-		
-		cur_flr = new_flr			# Once lift reaches the destination; current floor points to destination floor no
-		liftLEDOff(str(lift_leds[new_flr]))	# Turn OFF button press indication LED of the destinaton floor
-		time.sleep(1)				# Sleep for 1 second
+	saved = state.load()						# State left by the previous run, if any
+	if saved is not None and not 0 <= saved["floor"] < NO_OF_FLOORS:
+		saved = None						# Not from this building: start afresh
+	liftDefaultPos(saved["floor"] if saved else None)		# Set position of the lift (0th floor or restored)
+
+	loop = liftloop.EventLoop()					# Event loop running buttons and lift motion
+	outputs = liftctl.LedOutputs(led_frames,				# Lift LEDs of the board
+				     board.pos_gpios,
+				     board.lift_gpios,
+				     dir_up_batch, dir_down_batch)
+	lift = liftctl.LiftController(loop, outputs,			# Lift controller, starting at the default or restored position
+				      floor=saved["floor"] if saved else board.default_floor,
+				      policy=DISPATCH_POLICY, verbose=True,
+				      timing=board.timing)
+	if saved is not None:
+		print "Restored LIFT at floor #%d with %d pending call(s)" % (saved["floor"], len(saved["pending"]))
+		for floor in saved["pending"]:			# Calls pressed before the restart are served again,
+			if 0 <= floor < NO_OF_FLOORS and lift.calls.add(floor):	# without reporting them as new presses
+				outputs.call(floor, True)
+		if lift.calls:
+			lift.direction = saved["direction"]		# Keep sweeping the way it was going (an idle car stays at 0)
+			lift.task = loop.spawn(lift.serve())
+	state.open(lift)						# Fresh log of the current state
+	lift.listeners.append(state)					# Log every change of the lift
+	lift.listeners.append(journal)					# ... and keep a trace of it
+	if PARK_TIME is not None:					# Park the idle lift where the next call is likely
+		liftpark.IdleParker(loop, lift, liftpark.DemandModel(NO_OF_FLOORS, offset=-time.timezone), PARK_TIME)
+	button_watcher.attach(loop, lift.call, lift.calls.__contains__)	# Every new button press becomes a call to the lift
+	if gpio_backend.name == "fake":
+		loop.addReader(sys.stdin.fileno(), liftFakeInput)	# No board: floor numbers typed on stdin press the buttons
+	exporter = liftstats.StatsExporter(loop, STATS_FILE, STATS_SOCKET, STATS_PERIOD)	# Publish run-time statistics
+	server = liftserver.ControlServer(loop, lift, CONTROL_SOCKET, NO_OF_FLOORS)	# Calls and live state over a socket
+
+	print "\nWaiting for button press ..."
+	loop.run()							# Serve calls until the loop is stopped
 		 
 	liftExitAll()					# Clean up all GPIOs	
 	exit()						# Exit from Program
@@ -0,0 +1,306 @@
+#!/usr/bin/python
+##########################################################
+## Batch simulation of many lifts at once
+##
+## Keeps the state of thousands of independent one-car
+## buildings in NumPy arrays (floor, direction, pending
+## calls as a bitmask per car, state and timer) and runs
+## them together on a clock of fixed ticks, with the
+## movement and stop rules of liftctl.LiftController:
+##	call while idle	-> wait DEPART_DELAY, pick a target
+##	travel		-> one floor per chase + FLOOR_TIME,
+##			   target asked for again at every floor
+##	stop		-> serve the call, dwell DWELL_TIME,
+##			   then depart again if calls are left
+## Each instance has its own call rate, floor count and
+## timings, so a whole family of variants runs in one go.
+## The instances do not depend on each other, so each has
+## a clock of its own: one step runs the next event (a call
+## arriving or a timer running out) of every instance at
+## once, whatever its tick, and no empty tick is ever
+## stepped. The times of the next calls are drawn ahead.
+## Needs NumPy (python-numpy); the rest of the lift code
+## does not.
+##
+## Usage: liftbatch.py [--instances N] [--floors M]
+##		       [--rate R] [--rate-max R2] [--policy P]
+##		       [--hours H] [--tick T] [--seed S]
+##		       [--output FILE]
+##########################################################
+
+import sys
+import json
+import time
+import argparse
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+import liftctl
+
+
+MAX_FLOORS	=	53		# Pending calls are kept in the exact integer range of a double
+WAIT_BIN	=	1.0		# Seconds per bucket of the wait time histograms
+WAIT_BINS	=	600		# Buckets per instance (longer waits go in the last one)
+
+# States of a car
+IDLE	=	0
+DEPART	=	1		# Waiting DEPART_DELAY before leaving
+MOVE	=	2		# Travelling to the next floor
+DWELL	=	3		# Stopped at a served call
+
+POLICIES = ("fcfs", "look", "nearest")
+
+NEVER	=	2 ** 62		# Tick of no event (far beyond any run)
+
+
+################################################################################
+# Description	: Highest and lowest set bit of each value of an int64 array.
+# Return	: Bit number, -1 for a value of 0
+################################################################################
+def highBit (x):
+	return numpy.frexp(x.astype(numpy.float64))[1] - 1
+
+
+def lowBit (x):
+	return highBit(x & -x)
+
+
+################################################################################
+# Description	: Many one-car buildings stepped together.
+# Input		: @instances = number of buildings
+#		  @floors    = number of floors (scalar or one per instance)
+#		  @rate      = calls per hour (scalar or one per instance)
+#		  @policy    = dispatch policy, the same for all ("fcfs",
+#			       "look" or "nearest", see liftsched)
+#		  @tick      = seconds per tick (time resolution of the events)
+#		  @seed      = seed of the random calls
+#		  @timing    = dict of timings (scalars or one per instance):
+#			       "depart_delay", "step_pause", "floor_time",
+#			       "dwell_time" and "chase_time"
+# Note		: Every tick, each instance gets a call with probability
+#		  rate * tick (Poisson arrivals for a small tick) to a
+#		  uniformly random floor; the gap to the next call is drawn
+#		  at once from the matching geometric distribution.
+################################################################################
+class BatchSimulation(object):
+
+	def __init__(self, instances, floors=4, rate=60.0, policy="look", tick=0.1, seed=0, timing=None):
+		if numpy is None:
+			raise RuntimeError("liftbatch needs NumPy (python-numpy)")
+		if policy not in POLICIES:
+			raise ValueError("unknown policy \"%s\"" % policy)
+		n = instances
+		timing = timing or {}
+		def get(name, default):
+			return numpy.asarray(timing.get(name, default), dtype=numpy.float64) * numpy.ones(n)
+		def ticks(seconds):
+			return numpy.maximum(1, numpy.round(seconds / tick)).astype(numpy.int64)
+
+		self.n = n
+		self.policy = policy
+		self.tick = tick
+		self.rnd = numpy.random.RandomState(seed)
+		self.floors = numpy.asarray(floors, dtype=numpy.int64) * numpy.ones(n, dtype=numpy.int64)
+		if self.floors.min() < 2 or self.floors.max() > MAX_FLOORS:
+			raise ValueError("floors must be between 2 and %d" % MAX_FLOORS)
+		self.p_call = numpy.minimum(1.0, numpy.asarray(rate, dtype=numpy.float64) * tick / 3600.0 * numpy.ones(n))
+		self.depart_ticks = ticks(get("depart_delay", liftctl.DEPART_DELAY))
+		self.move_ticks = ticks(get("chase_time", liftctl.CHASE_TIME) +	# One floor: chase, pause, floor
+					get("step_pause", liftctl.STEP_PAUSE) +
+					get("floor_time", liftctl.FLOOR_TIME))
+		self.dwell_ticks = ticks(get("dwell_time", liftctl.DWELL_TIME))
+
+		self.ticks = 0						# Ticks run so far
+		self.now = numpy.zeros(n, dtype=numpy.int64)		# Tick of the event being run, per instance
+		self.next_call = self.gap(numpy.arange(n)) - 1		# Tick of the next call of each instance
+		self.due = numpy.full(n, NEVER, dtype=numpy.int64)	# Tick the DEPART/MOVE/DWELL of each car ends
+		self.wake = self.next_call.copy()			# Tick of the next event of each instance
+		self.cur_flr = numpy.zeros(n, dtype=numpy.int64)	# Current floor of each car
+		self.direction = numpy.zeros(n, dtype=numpy.int64)	# +1 up, -1 down, 0 idle
+		self.pending = numpy.zeros(n, dtype=numpy.int64)	# Bit f set = call to floor f pending
+		self.state = numpy.zeros(n, dtype=numpy.int64)
+		self.call_tick = numpy.zeros((n, MAX_FLOORS), dtype=numpy.int64)	# Tick of each pending call
+
+		self.calls = numpy.zeros(n, dtype=numpy.int64)
+		self.merged = numpy.zeros(n, dtype=numpy.int64)		# Calls to a floor already pending
+		self.served = numpy.zeros(n, dtype=numpy.int64)
+		self.travelled = numpy.zeros(n, dtype=numpy.int64)
+		self.wait_sum = numpy.zeros(n, dtype=numpy.float64)
+		self.wait_max = numpy.zeros(n, dtype=numpy.float64)
+		self.wait_hist = numpy.zeros((n, WAIT_BINS), dtype=numpy.int64)
+
+	# Ticks from one call of the instances i to their next one (NEVER at rate 0)
+	def gap(self, i):
+		p = self.p_call[i]
+		return numpy.where(p > 0, self.rnd.geometric(numpy.where(p > 0, p, 1.0)), NEVER)
+
+	# Place the calls of this tick, of the instances i
+	def arrivals(self, i):
+		floor = (self.rnd.random_sample(len(i)) * self.floors[i]).astype(numpy.int64)
+		bit = numpy.left_shift(1, floor)
+		new = (self.pending[i] & bit) == 0
+		self.calls[i] += 1
+		self.merged[i[~new]] += 1
+		i, floor, bit = i[new], floor[new], bit[new]
+		self.pending[i] |= bit
+		self.call_tick[i, floor] = self.now[i]
+		start = i[self.state[i] == IDLE]			# Idle car: the travel task starts
+		self.state[start] = DEPART
+		self.due[start] = self.now[start] + self.depart_ticks[start]
+		return
+
+	# Target floor of the cars i (see liftsched); -1 if no call is pending
+	def target(self, i):
+		pending = self.pending[i]
+		floor = self.cur_flr[i]
+		if self.policy == "fcfs":
+			stamps = numpy.where((pending[:, None] >> numpy.arange(MAX_FLOORS)) & 1,
+					     self.call_tick[i], numpy.iinfo(numpy.int64).max)
+			return numpy.where(pending != 0, stamps.argmin(axis=1), -1)
+		above = lowBit(pending & ~((numpy.left_shift(1, floor + 1)) - 1))
+		below = highBit(pending & (numpy.left_shift(1, floor) - 1))
+		# Nearest call; on a tie the older call wins
+		d_above = numpy.where(above >= 0, above - floor, MAX_FLOORS)
+		d_below = numpy.where(below >= 0, floor - below, MAX_FLOORS)
+		older = self.call_tick[i, numpy.maximum(above, 0)] < self.call_tick[i, numpy.maximum(below, 0)]
+		nearest = numpy.where((d_above < d_below) | ((d_above == d_below) & older), above, below)
+		if self.policy == "look":
+			nearest = numpy.where((self.direction[i] > 0) & (above >= 0), above, nearest)
+			nearest = numpy.where((self.direction[i] < 0) & (below >= 0), below, nearest)
+		here = (pending >> floor) & 1 == 1
+		return numpy.where(here, floor, numpy.where(pending != 0, nearest, -1))
+
+	# Cars i serve the call at their floor and dwell
+	def stop(self, i):
+		floor = self.cur_flr[i]
+		waits = (self.now[i] - self.call_tick[i, floor]) * self.tick
+		self.pending[i] &= ~numpy.left_shift(1, floor)
+		self.served[i] += 1
+		self.wait_sum[i] += waits
+		self.wait_max[i] = numpy.maximum(self.wait_max[i], waits)
+		self.wait_hist[i, numpy.minimum((waits / WAIT_BIN).astype(numpy.int64), WAIT_BINS - 1)] += 1
+		self.state[i] = DWELL
+		self.due[i] = self.now[i] + self.dwell_ticks[i]
+		return
+
+	# Cars i head for their target: stop if they are at it, else go one floor
+	def head(self, i):
+		dest = self.target(i)
+		floor = self.cur_flr[i]
+		idle = dest < 0
+		if idle.any():
+			self.state[i[idle]] = IDLE			# Remaining calls were cancelled
+			self.direction[i[idle]] = 0
+			self.due[i[idle]] = NEVER
+			i, dest, floor = i[~idle], dest[~idle], floor[~idle]
+		at = dest == floor
+		if at.any():
+			self.stop(i[at])
+			i, dest, floor = i[~at], dest[~at], floor[~at]
+		self.direction[i] = numpy.where(dest > floor, 1, -1)
+		self.state[i] = MOVE
+		self.due[i] = self.now[i] + self.move_ticks[i]
+		return
+
+	# Run the next event tick of every instance which has one before tick end
+	# Return : False if there is none
+	def step(self, end):
+		act = numpy.flatnonzero(self.wake < end)
+		if not len(act):
+			return False
+		now = self.wake[act]
+		self.now[act] = now
+		arriving = act[self.next_call[act] == now]
+		if len(arriving):
+			self.arrivals(arriving)				# A new call waits the full depart delay
+			self.next_call[arriving] = self.now[arriving] + self.gap(arriving)
+		done = act[self.due[act] == now]
+		if len(done):
+			state = self.state[done]
+			moved = done[state == MOVE]
+			heading = done[state != DWELL]			# Departing or moved on: where to now
+			dwelled = done[state == DWELL]
+			if len(moved):
+				self.cur_flr[moved] += self.direction[moved]
+				self.travelled[moved] += 1
+			if len(heading):
+				self.head(heading)
+			if len(dwelled):
+				more = self.pending[dwelled] != 0	# Dwell over: depart again or go idle
+				self.state[dwelled] = numpy.where(more, DEPART, IDLE)
+				self.due[dwelled] = numpy.where(more, self.now[dwelled] + self.depart_ticks[dwelled], NEVER)
+				self.direction[dwelled[~more]] = 0
+		self.wake[act] = numpy.minimum(self.next_call[act], self.due[act])
+		return True
+
+	def run(self, seconds):
+		end = self.ticks + int(round(seconds / self.tick))
+		while self.step(end):
+			pass
+		self.ticks = end
+		return
+
+	# Return : dict of per-instance lists of the results so far
+	def summary(self):
+		hours = self.ticks * self.tick / 3600.0
+		cum = numpy.cumsum(self.wait_hist, axis=1)
+		p95 = (cum >= numpy.maximum(1, numpy.ceil(0.95 * self.served))[:, None]).argmax(axis=1)
+		served = numpy.maximum(self.served, 1)
+		return {
+			"floors":		self.floors.tolist(),
+			"rate":			(self.p_call * 3600.0 / self.tick).tolist(),
+			"calls":		self.calls.tolist(),
+			"merged":		self.merged.tolist(),
+			"served":		self.served.tolist(),
+			"pending":		[bin(int(p)).count("1") for p in self.pending],
+			"wait_avg":		(self.wait_sum / served).tolist(),
+			"wait_p95":		numpy.where(self.served > 0, (p95 + 1) * WAIT_BIN, 0.0).tolist(),
+			"wait_max":		self.wait_max.tolist(),
+			"calls_per_hour":	(self.served / hours if hours else numpy.zeros(self.n)).tolist(),
+			"floors_travelled":	self.travelled.tolist(),
+		}
+
+
+def main (argv):
+	parser = argparse.ArgumentParser(description="Batch simulation of many lifts with NumPy")
+	parser.add_argument("--instances", type=int, default=1000)
+	parser.add_argument("--floors", type=int, default=4)
+	parser.add_argument("--rate", type=float, default=60.0, help="calls per hour")
+	parser.add_argument("--rate-max", type=float, help="spread the rates of the instances from --rate to this")
+	parser.add_argument("--policy", default="look", choices=POLICIES)
+	parser.add_argument("--hours", type=float, default=1.0)
+	parser.add_argument("--tick", type=float, default=0.1, help="seconds per tick (time resolution)")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--output", help="JSON file for the per-instance results (default: stdout)")
+	args = parser.parse_args(argv)
+
+	if numpy is None:
+		sys.stderr.write("liftbatch.py needs NumPy (python-numpy)\n")
+		return 1
+	rate = args.rate if args.rate_max is None else numpy.linspace(args.rate, args.rate_max, args.instances)
+	wall = time.time()
+	sim = BatchSimulation(args.instances, args.floors, rate, args.policy, args.tick, args.seed)
+	sim.run(args.hours * 3600)
+	res = sim.summary()
+	res.update({
+		"instances":	args.instances,
+		"policy":	args.policy,
+		"hours":	args.hours,
+		"tick":		args.tick,
+		"seed":		args.seed,
+		"wall_seconds":	time.time() - wall,
+	})
+
+	out = sys.stdout if not args.output else open(args.output, "w")
+	json.dump(res, out, indent=1, sort_keys=True)
+	out.write("\n")
+	if args.output:
+		out.close()
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,205 @@
+#!/usr/bin/python
+##########################################################
+## Benchmark of the lift controller under load
+##
+## Drives a building of software cars (liftgroup) with a
+## seeded passenger stream (lifttraffic) through fake hall
+## buttons, either accelerated on a virtual clock or in
+## real time, and writes the results as JSON so runs of
+## different versions can be compared.
+##
+## Usage: liftbench.py [--pattern P ...] [--policy P]
+##		       [--cars N] [--floors M] [--rate R]
+##		       [--hours H] [--seed S] [--realtime]
+##		       [--output FILE]
+##########################################################
+
+import sys
+import time
+import json
+import argparse
+
+import liftloop
+import liftgpio
+import liftgroup
+import lifttraffic
+
+
+################################################################################
+# Description	: Hall buttons of the benchmark building.
+#		  press(floor) calls callback(floor, stamp). On a real-time
+#		  loop the press goes through a liftgpio.FakeBackend edge and
+#		  a loop reader, like a button on the board; on a SimLoop,
+#		  which has no descriptors, it is delivered at once.
+################################################################################
+class FakeButtons(object):
+
+	def __init__(self, loop, floors, callback):
+		self.loop = loop
+		self.callback = callback
+		self.backend = None
+		if not isinstance(loop, liftloop.SimLoop):
+			self.backend = liftgpio.FakeBackend()
+			self.backend.setup([], [str(floor) for floor in range(floors)])
+			for fd, events, gpio in self.backend.edgeSources():
+				loop.addReader(fd, self._onEdge, events)
+
+	def press(self, floor):
+		if self.backend is None:
+			self.callback(floor, self.loop.time())
+		else:
+			self.backend.press(str(floor))
+			self.backend.releaseButton(str(floor))
+		return
+
+	def _onEdge(self, fd, events):
+		gpio, level = self.backend.ackEdge(fd)
+		self.callback(int(gpio), self.loop.time())
+		return
+
+	def close(self):
+		if self.backend is not None:
+			for fd in self.backend.edges:
+				self.loop.removeReader(fd)
+			self.backend.release()
+		return
+
+
+################################################################################
+# Description	: Value at fraction q (0..1) of a sorted list (nearest rank).
+################################################################################
+def percentile (values, q):
+	if not values:
+		return 0.0
+	return values[min(len(values) - 1, int(q * len(values)))]
+
+
+################################################################################
+# Description	: One benchmark run.
+#		  Passengers arrive at their origin and press the hall button;
+#		  they board the car which serves that hall call, ask for
+#		  their destination from inside it and leave at that floor.
+# Input		: @passengers = list of (time, origin, destination)
+#		  @cars       = number of cars
+#		  @floors     = number of floors
+#		  @policy     = dispatch policy of each car
+#		  @realtime   = run on the real clock instead of a virtual one
+#		  @timing     = timings of the cars (see liftgroup.makeGroup)
+################################################################################
+class Benchmark(object):
+
+	def __init__(self, passengers, cars=1, floors=4, policy="look", realtime=False, timing=None):
+		self.passengers = passengers
+		self.loop = liftloop.EventLoop() if realtime else liftloop.SimLoop()
+		self.group = liftgroup.makeGroup(self.loop, cars, floors, policy, timing=timing)
+		self.group.served = self.served
+		self.group.stopped = self.stopped
+		self.buttons = FakeButtons(self.loop, floors, self.group.call)
+		self.waiting = {}					# floor -> [(arrival time, destination)]
+		self.riding = {}					# car -> [(boarding time, destination)]
+		self.waits = []
+		self.rides = []
+		self.calls = 0						# Hall calls served
+		self.delivered = 0					# Passengers at their destination
+
+	def arrive(self, origin, dest):
+		self.waiting.setdefault(origin, []).append((self.loop.time(), dest))
+		self.buttons.press(origin)
+		return
+
+	def served(self, car, floor, stamp):
+		now = self.loop.time()
+		self.calls += 1
+		for arrival, dest in self.waiting.pop(floor, []):
+			self.waits.append(now - arrival)
+			self.riding.setdefault(car, []).append((now, dest))
+			self.group.carCall(car, dest, now)
+		return
+
+	def stopped(self, car, floor):
+		now = self.loop.time()
+		riding = []
+		for board, dest in self.riding.get(car, []):
+			if dest == floor:
+				self.rides.append(now - board)
+			else:
+				riding.append((board, dest))
+		self.delivered += len(self.riding.get(car, [])) - len(riding)
+		self.riding[car] = riding
+		if self.delivered == len(self.passengers):
+			self.loop.stop()
+		return
+
+	# Return : dict of the results of the run
+	def run(self):
+		start = self.loop.time()
+		for t, origin, dest in self.passengers:
+			self.loop.callAt(start + t, self.arrive, origin, dest)
+		wall = time.time()
+		cpu = time.clock()
+		if self.passengers:
+			self.loop.run()
+		cpu = time.clock() - cpu
+		wall = time.time() - wall
+		self.buttons.close()
+		hours = (self.loop.time() - start) / 3600.0
+		waits = sorted(self.waits)
+		rides = sorted(self.rides)
+		return {
+			"passengers":		len(self.passengers),
+			"delivered":		self.delivered,
+			"wait_avg":		sum(waits) / len(waits) if waits else 0.0,
+			"wait_p95":		percentile(waits, 0.95),
+			"wait_p99":		percentile(waits, 0.99),
+			"ride_avg":		sum(rides) / len(rides) if rides else 0.0,
+			"ride_p95":		percentile(rides, 0.95),
+			"ride_p99":		percentile(rides, 0.99),
+			"calls_per_hour":	self.calls / hours if hours else 0.0,
+			"floors_travelled":	sum(car.travelled for car in self.group.cars),
+			"events":		self.loop.events,
+			"cpu_per_event_us":	cpu * 1e6 / self.loop.events if self.loop.events else 0.0,
+			"sim_seconds":		self.loop.time() - start,
+			"wall_seconds":		wall,
+		}
+
+
+def main (argv):
+	parser = argparse.ArgumentParser(description="Lift controller benchmark")
+	parser.add_argument("--pattern", action="append", choices=sorted(lifttraffic.PATTERNS),
+			    help="traffic pattern, may be repeated (default: all)")
+	parser.add_argument("--policy", default="look")
+	parser.add_argument("--cars", type=int, default=1)
+	parser.add_argument("--floors", type=int, default=4)
+	parser.add_argument("--rate", type=float, default=120.0, help="passengers per hour")
+	parser.add_argument("--hours", type=float, default=1.0, help="hours of traffic per run")
+	parser.add_argument("--seed", type=int, default=1)
+	parser.add_argument("--realtime", action="store_true", help="run on the real clock")
+	parser.add_argument("--output", help="JSON file for the results (default: stdout)")
+	args = parser.parse_args(argv)
+
+	runs = []
+	for pattern in args.pattern or sorted(lifttraffic.PATTERNS):
+		passengers = lifttraffic.generate(pattern, args.rate, args.floors, args.hours * 3600, args.seed)
+		res = Benchmark(passengers, args.cars, args.floors, args.policy, args.realtime).run()
+		res.update({
+			"pattern":	pattern,
+			"policy":	args.policy,
+			"cars":		args.cars,
+			"floors":	args.floors,
+			"rate":		args.rate,
+			"hours":	args.hours,
+			"seed":		args.seed,
+			"realtime":	args.realtime,
+		})
+		runs.append(res)
+
+	out = sys.stdout if not args.output else open(args.output, "w")
+	json.dump({"runs": runs}, out, indent=1, sort_keys=True)
+	out.write("\n")
+	if args.output:
+		out.close()
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,134 @@
+##########################################################
+## Board and building layout of the lift
+##
+## The PINs of each role, the number of floors and the
+## timings come from a JSON file, e.g.
+##	{
+##	 "dir_leds":  [30, 66, 60, 67, 31, 69, 50],
+##	 "pos_leds":  [49, 47, 15, 46],
+##	 "lift_leds": [3, 23, 2, 26],
+##	 "buttons":   [14, 27, 22, 65],
+##	 "timing":    {"dwell_time": 2.0}
+##	}
+## Keys left out keep the built-in value. The layout is
+## compiled once into Pin/Floor records and ready-made
+## lists of GPIO names for the backends, so no PIN name
+## is formatted again while the lift runs.
+##########################################################
+
+import json
+import errno
+
+import liftctl
+import liftdebounce
+
+
+# Timings of the layout, in seconds (defaults of the controller and the debouncer)
+TIMING = {
+	"depart_delay":	liftctl.DEPART_DELAY,
+	"step_pause":	liftctl.STEP_PAUSE,
+	"floor_time":	liftctl.FLOOR_TIME,
+	"dwell_time":	liftctl.DWELL_TIME,
+	"chase_hold":	liftctl.CHASE_HOLD,
+	"debounce":	liftdebounce.DEBOUNCE_WINDOW,
+}
+
+
+################################################################################
+# Description	: One GPIO PIN of the board.
+#		  "gpio" is the PIN name used by the liftgpio backends.
+################################################################################
+class Pin(object):
+
+	__slots__ = ("number", "gpio")
+
+	def __init__(self, number):
+		self.number = number
+		self.gpio = str(number)
+
+	def __repr__(self):
+		return "Pin(%d)" % self.number
+
+
+################################################################################
+# Description	: PINs of one floor: call button, button press LED and
+#		  position LED.
+################################################################################
+class Floor(object):
+
+	__slots__ = ("index", "button", "led", "pos")
+
+	def __init__(self, index, button, led, pos):
+		self.index = index
+		self.button = button
+		self.led = led
+		self.pos = pos
+
+
+################################################################################
+# Description	: Compiled layout of a board.
+# Input		: @config = dict with the PIN numbers of "dir_leds", "pos_leds",
+#			    "lift_leds" and "buttons" (one per floor, bottom
+#			    to top for the last three), and optionally
+#			    "default_floor" and "timing" (see TIMING)
+# Note		: Raises ValueError if the layout is not consistent.
+################################################################################
+class Board(object):
+
+	def __init__(self, config):
+		pins = {}
+		def pin(number):
+			if number in pins:
+				raise ValueError("GPIO %d is used twice in the board layout" % number)
+			pins[number] = Pin(number)
+			return pins[number]
+
+		self.floors = len(config["buttons"])
+		if self.floors < 2:
+			raise ValueError("the board needs buttons for at least 2 floors")
+		for role in ("pos_leds", "lift_leds"):
+			if len(config[role]) != self.floors:
+				raise ValueError("%s: %d PINs for %d floors" % (role, len(config[role]), self.floors))
+		self.dir_leds = [pin(number) for number in config["dir_leds"]]
+		self.pos_leds = [pin(number) for number in config["pos_leds"]]
+		self.lift_leds = [pin(number) for number in config["lift_leds"]]
+		self.buttons = [pin(number) for number in config["buttons"]]
+		self.floor = [Floor(i, self.buttons[i], self.lift_leds[i], self.pos_leds[i]) for i in range(self.floors)]
+
+		self.default_floor = config.get("default_floor", 0)
+		if not 0 <= self.default_floor < self.floors:
+			raise ValueError("default_floor %d is not a floor of the board" % self.default_floor)
+		self.timing = dict(TIMING)
+		for key, value in config.get("timing", {}).items():
+			if key not in TIMING:
+				raise ValueError("unknown timing \"%s\"" % key)
+			self.timing[key] = float(value)
+
+		# Ready-made GPIO name lists for the backends and the LED engine
+		self.leds = [p.gpio for p in self.dir_leds + self.pos_leds + self.lift_leds]
+		self.inputs = [p.gpio for p in self.buttons]
+		self.dir_up = [p.gpio for p in self.dir_leds]
+		self.dir_down = self.dir_up[::-1]
+		self.pos_gpios = [p.gpio for p in self.pos_leds]
+		self.lift_gpios = [p.gpio for p in self.lift_leds]
+
+
+################################################################################
+# Description	: Load the layout of a board.
+# Input		: @path     = JSON layout file, or None; a missing file is
+#			      the same as an empty one
+#		  @defaults = built-in layout (same keys as the file)
+# Return	: Board
+################################################################################
+def loadBoard (path, defaults):
+	config = dict(defaults)
+	if path is not None:
+		try:
+			fo = open(path, "r")
+		except IOError as e:
+			if e.errno != errno.ENOENT:
+				raise
+		else:
+			config.update(json.load(fo))
+			fo.close()
+	return Board(config)
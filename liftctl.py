@@ -0,0 +1,286 @@
+##########################################################
+## Event driven lift controller
+##
+## Runs a lift car as coroutines on a liftloop.EventLoop:
+## calls are accepted at any time (also while the car is
+## moving) and kept in a liftsched.CallScheduler. A travel
+## task asks the scheduler where to go at every floor,
+## animates the direction LEDs, moves the position LED
+## floor by floor and waits at the door of every stop.
+## What the car shows on the board is left to its output
+## mapping (LedOutputs, or NullOutputs for a car which only
+## exists in software).
+##########################################################
+
+import liftplan
+import liftsched
+import liftstats
+
+
+# Timing of the lift (in seconds); same values as the old blocking main loop
+DEPART_DELAY	=	1.0		# Wait after a call before the car leaves
+STEP_PAUSE	=	0.01		# Pause between direction animation and floor move
+FLOOR_TIME	=	0.5		# Time spent at each floor passed
+DWELL_TIME	=	1.0		# Door dwell at the destination floor
+CHASE_HOLD	=	0.5		# Time each direction LED is lit in a chase
+DIR_LEDS	=	7		# Direction LEDs of the board
+CHASE_TIME	=	CHASE_HOLD * DIR_LEDS	# Direction chase of the board
+
+
+################################################################################
+# Description	: Output mapping of a car onto the LEDs of the board.
+# Input		: @leds       = LedFrameEngine used for all LED changes
+#		  @pos_leds   = position LED PINs (strings), one per floor
+#		  @lift_leds  = button press LED PINs (strings), one per floor,
+#				or None if the car has no call LEDs of its own
+#				(e.g. hall call LEDs owned by a group)
+#		  @up_batch   = LED frame batch of the upward direction chase
+#		  @down_batch = LED frame batch of the downward direction chase
+################################################################################
+class LedOutputs(object):
+
+	def __init__(self, leds, pos_leds, lift_leds, up_batch, down_batch):
+		self.leds = leds
+		self.pos_leds = pos_leds
+		self.lift_leds = lift_leds
+		self.up_batch = up_batch
+		self.down_batch = down_batch
+
+	def position(self, old, new):
+		self.leds.commit({self.pos_leds[old]: "0", self.pos_leds[new]: "1"})
+		return
+
+	def call(self, floor, on):
+		if self.lift_leds is not None:
+			self.leds.commit({self.lift_leds[floor]: "1" if on else "0"})
+		return
+
+	def frame(self, frame):
+		self.leds.commit(frame)
+		return
+
+	# LED frame batch of the direction chase for step (+1/-1)
+	def chase(self, step):
+		return self.up_batch if step > 0 else self.down_batch
+
+
+################################################################################
+# Description	: Output mapping of a car without any LEDs. The direction
+#		  chase is kept as a single timed step (and an empty last
+#		  frame, like the all-OFF frame of the board) so the car moves
+#		  with the same timing as one on the board.
+################################################################################
+class NullOutputs(object):
+
+	def __init__(self, chase_time=CHASE_TIME):
+		self.batch = [({}, chase_time), ({}, 0)]
+
+	def position(self, old, new):
+		return
+
+	def call(self, floor, on):
+		return
+
+	def frame(self, frame):
+		return
+
+	def chase(self, step):
+		return self.batch
+
+
+################################################################################
+# Description	: Lift controller for one car.
+# Input		: @loop    = liftloop.EventLoop the controller runs on
+#		  @outputs = output mapping of the car (LedOutputs/NullOutputs)
+#		  @floor   = floor where the car is at start
+#		  @policy  = dispatch policy name (see liftsched.POLICIES)
+#		  @name    = name of the car in messages
+#		  @verbose = print the progress of the lift on stdout
+#		  @timing  = dict overriding some of DEPART_DELAY, STEP_PAUSE,
+#			     FLOOR_TIME and DWELL_TIME ("depart_delay", ...)
+# Note		: call() and cancel() are the only entry points for stops;
+#		  they can be called from any loop callback (e.g. a button
+#		  edge reader or a group dispatcher).
+#		  park() moves an idle car without a call; any new call
+#		  stops the move at once, at the last floor reached.
+#		  "moved" and "stopped", if set, are called as
+#		  callback(car, floor) after each floor the car passes and at
+#		  each stop it serves.
+#		  Every function in "listeners" is called as
+#		  listener(car, event, floor) on each change of the car:
+#			"call"   - floor became a pending stop
+#			"cancel" - pending stop dropped without serving it
+#			"depart" - car leaves for floor (direction is set)
+#			"floor"  - car reached floor while travelling
+#			"stop"   - car serves the stop at floor
+#			"idle"   - no stops left (floor = current floor)
+################################################################################
+class LiftController(object):
+
+	def __init__(self, loop, outputs, floor=0, policy="fcfs", name="LIFT", verbose=False, timing=None):
+		self.loop = loop
+		self.outputs = outputs
+		self.floor = floor					# Current floor of the car
+		self.direction = 0					# +1 going up, -1 going down, 0 idle
+		self.calls = liftsched.CallScheduler(policy)		# Pending stops
+		self.task = None					# Travel task while the car is busy
+		self.parking = None					# Parking task while the idle car moves
+		self.travelled = 0					# Floors travelled so far
+		self.name = name
+		self.verbose = verbose
+		self.moved = None
+		self.stopped = None
+		self.listeners = []
+		timing = timing or {}
+		self.depart_delay = timing.get("depart_delay", DEPART_DELAY)
+		self.step_pause = timing.get("step_pause", STEP_PAUSE)
+		self.floor_time = timing.get("floor_time", FLOOR_TIME)
+		self.dwell_time = timing.get("dwell_time", DWELL_TIME)
+		self.plans = liftplan.PlanCache(self.compile)		# Timed plans of the recent trips
+
+	def _notify(self, event, floor):
+		for listener in self.listeners:
+			listener(self, event, floor)
+		return
+
+	# Accept a call to floor (stamp = time of the button press, if known)
+	def call(self, floor, stamp=None):
+		if self.verbose:
+			print "%s button is pressed for floor #%d" % (self.name, floor)
+		new = self.calls.add(floor, stamp)			# False if the floor is already pending
+		if new:
+			self.unpark()					# A real call wins over parking
+			self.outputs.call(floor, True)			# Glow the button press LED at once
+			self._notify("call", floor)
+		if new and (self.task is None or self.task.done):
+			self.task = self.loop.spawn(self.serve())
+		return
+
+	# Drop a pending stop (e.g. handed over to another car)
+	def cancel(self, floor):
+		if floor in self.calls:
+			self.calls.remove(floor)
+			self.outputs.call(floor, False)
+			self._notify("cancel", floor)
+		return
+
+	def idle(self):
+		return not self.calls and (self.task is None or self.task.done)
+
+	# Move the idle car to floor (e.g. where the next call is likely)
+	def park(self, floor):
+		self.unpark()
+		if floor != self.floor and self.idle():
+			if self.verbose:
+				print "%s parking at floor #%d" % (self.name, floor)
+			self.parking = self.loop.spawn(self.parkTo(floor))
+		return
+
+	# Stop a parking move, leaving the car at the last floor it reached
+	# (also from inside the parking task, e.g. a call handed over by a
+	# group dispatcher as the car passes a floor)
+	def unpark(self):
+		if self.parking is not None and not self.parking.done:
+			self.parking.cancel()
+			if self.direction:
+				self.outputs.frame(self.outputs.chase(self.direction)[-1][0])	# Direction LEDs OFF
+			self.direction = 0
+			liftstats.counters["park.cancelled"] += 1
+		self.parking = None
+		return
+
+	# Parking task: go to floor without stopping
+	def parkTo(self, floor):
+		liftstats.counters["park.moves"] += 1
+		self.direction = 1 if floor > self.floor else -1
+		self._notify("depart", floor)
+		yield self.ride(floor, retarget=False)
+		if self.parking is None:
+			return						# Stopped by unpark() during the ride
+		self.direction = 0
+		self._notify("idle", self.floor)
+		return
+
+	# Seconds until the car would stop at floor, counting the stops it serves first
+	def estimate(self, floor):
+		floor_time = self.step_pause + self.floor_time + sum(hold for frame, hold in self.outputs.chase(1))
+		t = 0.0
+		pos = self.floor
+		for stop in self.calls.route(self.floor, self.direction, floor):
+			t += abs(stop - pos) * floor_time + self.depart_delay
+			if stop == floor:
+				break
+			t += self.dwell_time
+			pos = stop
+		return t
+
+	# Travel task: serve the pending calls until there are none left
+	def serve(self):
+		while self.calls:
+			yield self.depart_delay
+			dest = self.calls.target(self.floor, self.direction)
+			if dest is not None and dest != self.floor:
+				if self.verbose:
+					print "%s going %s to floor #%d" % (self.name, "UP" if dest > self.floor else "DOWN", dest)
+				self.direction = 1 if dest > self.floor else -1
+				self._notify("depart", dest)
+			while dest is not None and self.floor != dest:
+				yield self.ride(dest)
+				dest = self.calls.target(self.floor, self.direction)
+			if dest is None:
+				break						# Remaining stops were cancelled
+			stamp = self.calls.remove(dest)
+			self.outputs.call(dest, False)			# Turn OFF button press LED of the stop
+			if stamp is not None:
+				liftstats.record("call_arrival", self.loop.time() - stamp)
+			self._notify("stop", dest)
+			if self.stopped is not None:
+				self.stopped(self, dest)
+			yield self.dwell_time
+		self.direction = 0
+		self._notify("idle", self.floor)
+		return
+
+	def compile(self, origin, dest):
+		return liftplan.compilePlan(origin, dest, self.outputs.chase, self.step_pause, self.floor_time)
+
+	# Ride towards dest by replaying the plans of the trip.
+	# With retarget, the target is asked for again at every floor and a
+	# new plan from there is started at the deadline the old one was at.
+	# Without (a parking move), the ride ends at the first action after
+	# unpark().
+	# Each direction chase, from its first to its last frame, is recorded
+	# as "animation".
+	def ride(self, dest, retarget=True):
+		trip = [dest, self.loop.time(), None, None]		# target, deadline of the last check,
+									# time of the first and last frame of the chase
+		def apply(action, arg, deadline):
+			if not retarget and self.parking is None:
+				trip[0] = None
+				return False
+			if action == liftplan.FRAME:
+				self.outputs.frame(arg)
+				trip[3] = self.loop.time()
+				if trip[2] is None:
+					trip[2] = trip[3]
+			elif action == liftplan.MOVE:
+				if trip[2] is not None:
+					liftstats.record("animation", trip[3] - trip[2])
+					trip[2] = None
+				self.outputs.position(self.floor, arg)
+				self.floor = arg
+				self.travelled += 1
+				self._notify("floor", self.floor)
+				if self.moved is not None:
+					self.moved(self, self.floor)
+			else:
+				trip[1] = deadline
+				if retarget:
+					trip[0] = self.calls.target(self.floor, self.direction)
+					return trip[0] == dest
+			return True
+		while trip[0] is not None and self.floor != trip[0]:
+			dest = trip[0]
+			self.direction = 1 if dest > self.floor else -1
+			yield liftplan.replay(self.loop, self.plans.get(self.floor, dest), trip[1], apply)
+		return
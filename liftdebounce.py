@@ -0,0 +1,62 @@
+##########################################################
+## Software debounce of the lift buttons
+##
+## Sits between the raw button edges and the calls to the
+## lift. An edge becomes a call only if
+##	- the button was not accepted in the last "window"
+##	  seconds (contact bounce gives a burst of edges),
+##	- the button still reads pressed (a spike on the line
+##	  gives an edge but no level), and
+##	- its floor is not already pending (a passenger
+##	  pressing again does not add any dispatch work).
+## Nothing sleeps: a rejected edge is only counted
+## (debounce.bounce, debounce.level, debounce.merged).
+##########################################################
+
+from liftstats import counters
+
+
+DEBOUNCE_WINDOW	=	0.05		# Seconds during which more edges of an accepted button are bounce
+
+
+################################################################################
+# Description	: Debounce and call coalescing for a set of buttons.
+# Input		: @backend = liftgpio backend the button levels are read from
+#		  @window  = seconds, per button, during which edges after an
+#			     accepted one are dropped
+#		  @active  = level ("0"/"1") of a pressed button; buttons with
+#			     a "falling" edge are active low
+#		  @pending = function(floor) telling whether a call to floor is
+#			     already pending, or None
+################################################################################
+class Debouncer(object):
+
+	def __init__(self, backend, window=DEBOUNCE_WINDOW, active="0", pending=None):
+		self.backend = backend
+		self.window = window
+		self.active = active
+		self.pending = pending
+		self.last = {}						# GPIO PIN -> time of the last accepted edge
+
+	# Filter one button edge
+	# Input  : @gpio  = GPIO PIN of the button
+	#	   @floor = floor of the button
+	#	   @stamp = time of the edge
+	#	   @level = value of the button read with the edge (see the
+	#		    backend's ackEdge()), or None to read it here
+	# Return : True if the edge is a new call to floor
+	def accept(self, gpio, floor, stamp, level=None):
+		last = self.last.get(gpio)
+		if last is not None and stamp - last < self.window:
+			counters["debounce.bounce"] += 1
+			return False
+		if level is None:
+			level = self.backend.read(gpio)
+		if level != self.active:
+			counters["debounce.level"] += 1
+			return False
+		self.last[gpio] = stamp
+		if self.pending is not None and self.pending(floor):
+			counters["debounce.merged"] += 1
+			return False
+		return True
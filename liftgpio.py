@@ -0,0 +1,614 @@
+##########################################################
+## GPIO access for the Lift Simulation Board
+##
+## The sysfs helpers gpioExport(), gpioSetDir(), ... and
+## three interchangeable backends built on top of the
+## kernel interfaces:
+##	SysfsBackend	- /sys/class/gpio, one file per PIN
+##	ChardevBackend	- /dev/gpiochipN, all lines of a chip
+##			  requested at once and set/read with a
+##			  single ioctl
+##	FakeBackend	- in memory, with simulated button
+##			  presses, for running without a board
+## Every backend takes GPIO PINs in the form of string.
+##########################################################
+
+import os
+import time
+import errno
+import fcntl
+import array
+import select
+import struct
+
+from liftstats import counters
+
+
+# PATH of a GPIO specific sysfs interfce directory on Linux system             
+SYSFS_GPIO_DIR = "/sys/class/gpio"
+
+
+             	
+################################################################################
+# Description 	: Write the GPIO PIN value on "/sys/class/gpio/export" file.
+# 		 This will export (make visible) the directory associated
+#		 with particular GPIO pin under sysfs interface.
+#		 e.g. if value of GPIO PIN is "23" then "/sys/class/gpio/gpio23"
+#		 directory will be exported (will become visible)
+# Input   	: @gpio = Value of GPIO PIN (in the form of string)
+# Return	: None
+# Note		: Must be called for a particular GPIO PIN before using that PIN.
+################################################################################
+def gpioExport (gpio): 
+	try:
+   		fo = open(SYSFS_GPIO_DIR + "/export","w")  			
+   		counters["gpioExport.open"] += 1
+   		fo.write(gpio)
+   		counters["gpioExport.write"] += 1
+   		fo.close()
+   		return
+   	except IOError:
+                return
+
+#################################################################################
+# Description : Exactly opposite of export() function above.
+# 		 Write the GPIO PIN value on "/sys/class/gpio/unexport" file.
+# 		 This will un-export (make invisible) the directory associated
+#		 with particular GPIO pin under sysfs interface.
+#		 e.g. if value of GPIO PIN is "23" then "/sys/class/gpio/gpio23"
+#		 directory will be unexported (will become invisible)
+# Input	: @gpio = Value of GPIO PIN (in the form of string)
+# Return	: None
+# Note		: Must be called for a particular GPIO PIN after it is used
+# 		  This makes a PIN free from GPIO functionality
+#################################################################################
+def gpioUnexport (gpio):
+	try: 
+   		fo = open(SYSFS_GPIO_DIR + "/unexport","w")  
+   		counters["gpioUnexport.open"] += 1
+   		fo.write(gpio)
+   		counters["gpioUnexport.write"] += 1
+   		fo.close()
+   		return
+   	except IOError:
+ 		return
+
+
+################################################################################################
+# Description : Write the direction ("in"/"out") on "/sys/class/gpio/gpioN/direction"
+#               where "gpioN" stands for the directory already exported.
+# 		 This will configure a particular GPIO PIN as an input or output pin.
+# Input	: @gpio = Value of GPIO PIN (in the form of string)
+# 		  @flag  = Value of direction either "in" or "out"
+# Return	: None
+# Note		: Make sure to export a GPIO PIN (using gpioExport) before calling this function
+#################################################################################################
+
+def gpioSetDir (gpio, flag):
+	try: 
+	   	fo = open(SYSFS_GPIO_DIR + "/gpio" + gpio + "/direction" ,"w")  
+	   	counters["gpioSetDir.open"] += 1
+	   	fo.write(flag)
+	   	counters["gpioSetDir.write"] += 1
+	   	fo.close()
+	   	return
+ 	except IOError:
+                return
+
+################################################################################################
+# Description  : Write the value ("0"/"1") on "/sys/class/gpio/gpioN/value"
+#                where "gpioN" stands for the directory already exported.
+# 		  This will make particular GPIO PIN as LOW or HIGH (CLEAR or SET).
+# Input   	: @gpio = Value of GPIO PIN (in the form of string)
+# 		  @val  = Value of GPIO either "0" or "1"
+# Return	: None
+# Note		: Make sure to export a GPIO PIN (using gpioExport) and
+# 		  set the direction as "out" (using gpioSetDir) before calling this function
+#################################################################################################
+
+def gpioSetVal (gpio, val):
+	try: 
+		fo = open(SYSFS_GPIO_DIR + "/gpio" + gpio + "/value" ,"w")  
+		counters["gpioSetVal.open"] += 1
+		fo.write(val)
+		counters["gpioSetVal.write"] += 1
+		fo.close()
+		return
+	except IOError:
+                return
+
+
+################################################################################################
+# Description  : Write the Edge value on "/sys/class/gpio/gpioN/edge"
+#                where "gpioN" stands for the directory already exported.
+# 		 This will set the GPIO edge value.
+# 		 Edge can be set to any of the 4 values
+# 			"falling"	"rising" 	"both"		"none"
+# Input		: @gpio = Value of GPIO PIN (in the form of string)
+#		  @flag  = Value of GPIO edge
+# Return	: None
+# Note		: Make sure to export a GPIO PIN (using gpioExport) before calling this function
+#################################################################################################
+
+def gpioSetEdge (gpio, flag): 
+	try:
+		fo = open(SYSFS_GPIO_DIR + "/gpio" + gpio + "/edge" ,"w")  
+		counters["gpioSetEdge.open"] += 1
+		fo.write(flag)
+		counters["gpioSetEdge.write"] += 1
+		fo.close()
+   		return
+	except IOError:
+                return
+
+
+################################################################################################
+# Description  : Read an attribute file ("direction", "edge", "value", ...) of an
+#                exported GPIO PIN under "/sys/class/gpio/gpioN/".
+# Input		: @gpio = Value of GPIO PIN (in the form of string)
+#		  @attr = name of the attribute file
+# Return	: Content of the file without the trailing newline,
+#		  or None if it can not be read (e.g. PIN not exported)
+#################################################################################################
+
+def gpioGetAttr (gpio, attr):
+	try:
+		fo = open(SYSFS_GPIO_DIR + "/gpio" + gpio + "/" + attr, "r")
+		counters["gpioGetAttr.open"] += 1
+		val = fo.read().strip()
+		counters["gpioGetAttr.read"] += 1
+		fo.close()
+		return val
+	except IOError:
+		return None
+
+
+################################################################################################
+# Description  : Wait until the kernel (and udev, which sets the permissions of the
+#                new files) has finished exporting GPIO PINs.
+# Input		: @gpios   = list of GPIO PINs (in the form of string)
+#		  @timeout = seconds to wait at most
+# Return	: None
+# Note		: Export all the PINs first and wait for all of them once, so that
+#		  the udev work for the different PINs overlaps.
+#################################################################################################
+
+def gpioWaitExported (gpios, timeout=2.0):
+	end = time.time() + timeout
+	for gpio in gpios:
+		path = SYSFS_GPIO_DIR + "/gpio" + gpio + "/direction"
+		while not os.access(path, os.W_OK) and time.time() < end:
+			time.sleep(0.001)
+	return
+
+
+################################################################################
+# Description	: Pool of open "/sys/class/gpio/gpioN/value" descriptors,
+#		  keyed by GPIO PIN (in the form of string).
+#		  Each value file is opened once (see SysfsBackend.setup()) and every
+#		  later write goes through the stored descriptor as a positioned
+#		  write at offset 0, so an LED update costs one write instead of
+#		  open()/write()/close().
+#		  If a descriptor goes stale (e.g. the PIN was unexported and
+#		  exported again behind our back) it is reopened and the write
+#		  is retried once.
+# Note		: Python 2 has no os.pwrite(); there the positioned write is
+#		  done as lseek() + write() on the pooled descriptor.
+################################################################################
+class GpioValuePool(object):
+
+	def __init__(self):
+		self.fds = {}						# GPIO PIN (string) -> descriptor of its value file
+
+	def _path(self, gpio):
+		return SYSFS_GPIO_DIR + "/gpio" + gpio + "/value"
+
+	def _pwrite(self, fd, val):
+		counters["pool.write"] += 1
+		if hasattr(os, "pwrite"):
+			os.pwrite(fd, val, 0)
+		else:
+			os.lseek(fd, 0, os.SEEK_SET)
+			os.write(fd, val)
+
+	# Open (or reopen) the value file of a PIN and keep its descriptor
+	# Return : True if the PIN is now pooled
+	def open(self, gpio):
+		self.close(gpio)
+		try:
+			self.fds[gpio] = os.open(self._path(gpio), os.O_WRONLY)
+			counters["pool.open"] += 1
+			return True
+		except OSError:
+			return False
+
+	def openAll(self, gpios):
+		for gpio in gpios:
+			self.open(gpio)
+		return
+
+	def close(self, gpio):
+		fd = self.fds.pop(gpio, None)
+		if fd is not None:
+			try:
+				os.close(fd)
+			except OSError:
+				pass
+		return
+
+	def closeAll(self):
+		for gpio in list(self.fds):
+			self.close(gpio)
+		return
+
+	# Write val ("0"/"1") through the pooled descriptor of a PIN
+	# Return : True if written, False if the PIN is not pooled (or can not
+	#	   be reopened), in which case the caller falls back to open()
+	def write(self, gpio, val):
+		fd = self.fds.get(gpio)
+		if fd is None:
+			return False
+		try:
+			self._pwrite(fd, val)
+			return True
+		except OSError as e:
+			if e.errno == errno.EINTR:
+				return self.write(gpio, val)
+		# Stale descriptor: reopen once and retry
+		if not self.open(gpio):
+			return False
+		try:
+			self._pwrite(self.fds[gpio], val)
+			return True
+		except OSError:
+			self.close(gpio)
+			return False
+
+
+################################################################################
+# Description	: Backend on the sysfs interface ("/sys/class/gpio").
+#		  Output values are written through a GpioValuePool, button
+#		  edges are watched on the value files with EPOLLPRI.
+################################################################################
+class SysfsBackend(object):
+
+	name = "sysfs"
+
+	def __init__(self):
+		self.pool = GpioValuePool()
+		self.outputs = []
+		self.inputs = []
+		self.edges = {}						# edge fd -> GPIO PIN
+		self.watched = {}					# GPIO PIN -> edge fd
+
+	# Export all the PINs, set their direction, clear the outputs and
+	# set the edge of the inputs.
+	# PINs which are still exported (e.g. from a previous run with
+	# release(keep=True)) keep their setup: only the attributes which
+	# differ are written, so a warm restart costs a few reads.
+	def setup(self, outputs, inputs, edge="falling"):
+		self.outputs = list(outputs)
+		self.inputs = list(inputs)
+		fresh = set(gpio for gpio in self.outputs + self.inputs
+			    if not os.path.isdir(SYSFS_GPIO_DIR + "/gpio" + gpio))
+		for gpio in fresh:
+			gpioExport(gpio)
+		gpioWaitExported(sorted(fresh))
+		cleared = set()
+		for gpio in self.outputs:
+			if gpio in fresh or gpioGetAttr(gpio, "direction") != "out":
+				gpioSetDir(gpio, flag="low")		# Output and cleared in one write
+				cleared.add(gpio)
+		for gpio in self.inputs:
+			if gpio in fresh or gpioGetAttr(gpio, "direction") != "in":
+				gpioSetDir(gpio, flag="in")
+			if gpio in fresh or gpioGetAttr(gpio, "edge") != edge:
+				gpioSetEdge(gpio, flag=edge)
+		self.pool.openAll(self.outputs)
+		for gpio in self.outputs:
+			if gpio not in cleared:
+				self.write(gpio, "0")
+		return
+
+	# Clear the outputs and unexport all the PINs
+	# (keep = leave them exported and set up for the next run)
+	def release(self, keep=False):
+		self.closeEdges()
+		for gpio in self.outputs:
+			self.write(gpio, "0")
+			self.pool.close(gpio)
+			if not keep:
+				gpioUnexport(gpio)
+		if not keep:
+			for gpio in self.inputs:
+				gpioUnexport(gpio)
+		self.pool.closeAll()
+		self.outputs = []
+		self.inputs = []
+		return
+
+	def write(self, gpio, val):
+		if not self.pool.write(gpio, val):
+			gpioSetVal(gpio, val)
+		return
+
+	def writeMany(self, values):
+		for gpio, val in values:
+			self.write(gpio, val)
+		return
+
+	# Read the value of a PIN; an input watched for edges is read through
+	# its edge descriptor, without opening the value file again
+	def read(self, gpio):
+		fd = self.watched.get(gpio)
+		if fd is not None:
+			os.lseek(fd, 0, os.SEEK_SET)
+			counters["read.read"] += 1
+			return os.read(fd, 1)
+		fo = open(SYSFS_GPIO_DIR + "/gpio" + gpio + "/value", "r")
+		counters["read.open"] += 1
+		val = fo.read(1)
+		counters["read.read"] += 1
+		fo.close()
+		return val
+
+	# Open the value files of the inputs for edge detection
+	# Return : list of (fd, epoll events, GPIO PIN)
+	def edgeSources(self):
+		for gpio in self.inputs:
+			fd = os.open(SYSFS_GPIO_DIR + "/gpio" + gpio + "/value", os.O_RDONLY)
+			os.read(fd, 2)					# Make dummy read() call on it
+			counters["edgeSources.open"] += 1
+			counters["edgeSources.read"] += 1
+			self.edges[fd] = gpio
+			self.watched[gpio] = fd
+		return [(fd, select.EPOLLPRI | select.EPOLLERR, gpio) for fd, gpio in self.edges.items()]
+
+	# Re-arm the edge notification of fd
+	# Return : (GPIO PIN of the edge, its value read on the way)
+	def ackEdge(self, fd):
+		os.lseek(fd, 0, os.SEEK_SET)
+		val = os.read(fd, 2)[:1]
+		counters["ackEdge.read"] += 1
+		return self.edges.get(fd), val
+
+	def closeEdges(self):
+		for fd in self.edges:
+			os.close(fd)
+		self.edges = {}
+		self.watched = {}
+		return
+
+
+# GPIO character device ABI (v1), see <linux/gpio.h>
+GPIOHANDLES_MAX			=	64
+GPIOHANDLE_REQUEST_INPUT	=	1 << 0
+GPIOHANDLE_REQUEST_OUTPUT	=	1 << 1
+GPIOEVENT_REQUEST_RISING_EDGE	=	1 << 0
+GPIOEVENT_REQUEST_FALLING_EDGE	=	1 << 1
+GPIOEVENT_REQUEST_BOTH_EDGES	=	GPIOEVENT_REQUEST_RISING_EDGE | GPIOEVENT_REQUEST_FALLING_EDGE
+
+gpiohandle_request	=	struct.Struct("64I I 64B 32s I i")
+gpioevent_request	=	struct.Struct("I I I 32s i")
+gpiohandle_data		=	struct.Struct("64B")
+gpioevent_data		=	struct.Struct("Q I 4x")
+
+def _IOWR (nr, size):
+	return (3 << 30) | (size << 16) | (0xB4 << 8) | nr
+
+GPIO_GET_LINEHANDLE_IOCTL		=	_IOWR(0x03, gpiohandle_request.size)
+GPIO_GET_LINEEVENT_IOCTL		=	_IOWR(0x04, gpioevent_request.size)
+GPIOHANDLE_GET_LINE_VALUES_IOCTL	=	_IOWR(0x08, gpiohandle_data.size)
+GPIOHANDLE_SET_LINE_VALUES_IOCTL	=	_IOWR(0x09, gpiohandle_data.size)
+
+EDGE_FLAGS = {
+	"rising":	GPIOEVENT_REQUEST_RISING_EDGE,
+	"falling":	GPIOEVENT_REQUEST_FALLING_EDGE,
+	"both":		GPIOEVENT_REQUEST_BOTH_EDGES,
+}
+
+
+################################################################################
+# Description	: Backend on the GPIO character devices ("/dev/gpiochipN").
+#		  GPIO PIN N is line N % 32 of gpiochip N / 32 (the numbering
+#		  of the Beaglebone Black banks). All the output lines of a
+#		  chip are requested as one line handle, so writeMany() sets
+#		  every changed LED of a chip with a single ioctl. Each input
+#		  line is requested as a line event for its edge.
+# Note		: Needs a kernel with the GPIO character device (4.8 or
+#		  later); no sysfs export is done.
+################################################################################
+class ChardevBackend(object):
+
+	name = "chardev"
+
+	def __init__(self, chip_path="/dev/gpiochip%d", lines_per_chip=32, label="lift"):
+		self.chip_path = chip_path
+		self.lines_per_chip = lines_per_chip
+		self.label = label
+		self.handles = {}					# chip -> [handle fd, line offsets, values]
+		self.line = {}						# output GPIO PIN -> (chip, index in handle)
+		self.inputs = []
+		self.edge = "falling"
+		self.events = {}					# GPIO PIN -> line event fd
+		self.edges = {}						# line event fd -> GPIO PIN
+
+	def _chipLine(self, gpio):
+		return divmod(int(gpio), self.lines_per_chip)
+
+	def _ioctl(self, fd, request, packed):
+		counters["chardev.ioctl"] += 1
+		buf = array.array("B", packed)
+		fcntl.ioctl(fd, request, buf, True)
+		return buf.tostring()
+
+	# Request all the output lines (one handle per chip, all cleared) and a
+	# line event for every input line
+	def setup(self, outputs, inputs, edge="falling"):
+		chips = {}
+		for gpio in outputs:
+			chip, offset = self._chipLine(gpio)
+			chips.setdefault(chip, []).append((offset, gpio))
+		for chip, lines in chips.items():
+			offsets = [offset for offset, gpio in lines]
+			req = gpiohandle_request.pack(*(offsets + [0] * (GPIOHANDLES_MAX - len(offsets)) +
+							[GPIOHANDLE_REQUEST_OUTPUT] + [0] * GPIOHANDLES_MAX +
+							[self.label, len(offsets), -1]))
+			fd = self._requestFd(chip, GPIO_GET_LINEHANDLE_IOCTL, req, gpiohandle_request)
+			self.handles[chip] = [fd, offsets, [0] * GPIOHANDLES_MAX]
+			for index, (offset, gpio) in enumerate(lines):
+				self.line[gpio] = (chip, index)
+		self.inputs = list(inputs)
+		self.edge = edge
+		for gpio in self.inputs:
+			chip, offset = self._chipLine(gpio)
+			req = gpioevent_request.pack(offset, GPIOHANDLE_REQUEST_INPUT, EDGE_FLAGS[edge], self.label, -1)
+			self.events[gpio] = self._requestFd(chip, GPIO_GET_LINEEVENT_IOCTL, req, gpioevent_request)
+		return
+
+	# Issue a line request on a chip; Return : fd of the lines
+	def _requestFd(self, chip, request, req, layout):
+		chip_fd = os.open(self.chip_path % chip, os.O_RDWR)
+		try:
+			res = self._ioctl(chip_fd, request, req)
+		finally:
+			os.close(chip_fd)
+		return layout.unpack(res)[-1]
+
+	# Clear the outputs and give all the lines back (nothing is exported,
+	# so there is nothing to keep)
+	def release(self, keep=False):
+		self.writeMany([(gpio, "0") for gpio in self.line])
+		for fd, offsets, values in self.handles.values():
+			os.close(fd)
+		for fd in self.events.values():
+			os.close(fd)
+		self.handles = {}
+		self.line = {}
+		self.events = {}
+		self.edges = {}
+		self.inputs = []
+		return
+
+	def write(self, gpio, val):
+		self.writeMany([(gpio, val)])
+		return
+
+	def writeMany(self, values):
+		changed = set()
+		for gpio, val in values:
+			chip, index = self.line[gpio]
+			self.handles[chip][2][index] = 1 if val == "1" else 0
+			changed.add(chip)
+		for chip in changed:
+			fd, offsets, vals = self.handles[chip]
+			self._ioctl(fd, GPIOHANDLE_SET_LINE_VALUES_IOCTL, gpiohandle_data.pack(*vals))
+		return
+
+	def read(self, gpio):
+		if gpio in self.events:
+			fd, index = self.events[gpio], 0
+		else:
+			chip, index = self.line[gpio]
+			fd = self.handles[chip][0]
+		vals = gpiohandle_data.unpack(self._ioctl(fd, GPIOHANDLE_GET_LINE_VALUES_IOCTL, gpiohandle_data.pack(*([0] * GPIOHANDLES_MAX))))
+		return "1" if vals[index] else "0"
+
+	# Return : list of (fd, epoll events, GPIO PIN) of the input line events
+	def edgeSources(self):
+		self.edges = dict((fd, gpio) for gpio, fd in self.events.items())
+		return [(fd, select.EPOLLIN, gpio) for fd, gpio in self.edges.items()]
+
+	# Consume one event of fd
+	# Return : (GPIO PIN of the edge, None: the event does not give the
+	#	   current value of the line)
+	def ackEdge(self, fd):
+		os.read(fd, gpioevent_data.size)
+		return self.edges.get(fd), None
+
+	# The line event fds live as long as the lines are requested
+	def closeEdges(self):
+		self.edges = {}
+		return
+
+
+################################################################################
+# Description	: Backend which keeps every PIN in memory.
+#		  press(gpio) simulates a button press: the input goes low and
+#		  an edge is signalled on a pipe which can be watched with
+#		  epoll like a real GPIO; releaseButton(gpio) lets it go high.
+#		  "writes" counts the values written, for tests.
+################################################################################
+class FakeBackend(object):
+
+	name = "fake"
+
+	def __init__(self):
+		self.values = {}					# GPIO PIN -> "0"/"1"
+		self.inputs = []
+		self.pipes = {}						# input GPIO PIN -> (read fd, write fd)
+		self.edges = {}						# read fd -> GPIO PIN
+		self.writes = 0
+
+	def setup(self, outputs, inputs, edge="falling"):
+		for gpio in outputs:
+			self.values[gpio] = "0"
+		self.inputs = list(inputs)
+		for gpio in self.inputs:
+			self.values[gpio] = "1"				# Buttons idle high, pressed low
+		return
+
+	def release(self, keep=False):
+		self.closeEdges()
+		self.values = {}
+		self.inputs = []
+		return
+
+	def write(self, gpio, val):
+		self.values[gpio] = val
+		self.writes += 1
+		return
+
+	def writeMany(self, values):
+		for gpio, val in values:
+			self.write(gpio, val)
+		return
+
+	def read(self, gpio):
+		return self.values.get(gpio, "0")
+
+	def press(self, gpio):
+		self.values[gpio] = "0"
+		if gpio in self.pipes:
+			os.write(self.pipes[gpio][1], "x")
+		return
+
+	def releaseButton(self, gpio):
+		self.values[gpio] = "1"
+		return
+
+	def edgeSources(self):
+		for gpio in self.inputs:
+			self.pipes[gpio] = os.pipe()
+			self.edges[self.pipes[gpio][0]] = gpio
+		return [(fd, select.EPOLLIN, gpio) for fd, gpio in self.edges.items()]
+
+	def ackEdge(self, fd):
+		os.read(fd, 1)
+		gpio = self.edges.get(fd)
+		return gpio, self.values.get(gpio, "0")
+
+	def closeEdges(self):
+		for r, w in self.pipes.values():
+			os.close(r)
+			os.close(w)
+		self.pipes = {}
+		self.edges = {}
+		return
+
+
+BACKENDS = {
+	SysfsBackend.name:	SysfsBackend,
+	ChardevBackend.name:	ChardevBackend,
+	FakeBackend.name:	FakeBackend,
+}
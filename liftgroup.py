@@ -0,0 +1,130 @@
+##########################################################
+## Group control of several lift cars
+##
+## A GroupDispatcher owns the hall calls of a building and
+## hands each of them to the car with the lowest estimated
+## time to serve it (distance, direction and the stops the
+## car already has queued, see LiftController.estimate()).
+## Assignments are looked at again whenever a car passes a
+## floor or serves a stop, and a call moves to another car
+## when that car would now be there clearly sooner.
+##########################################################
+
+import liftctl
+
+
+REASSIGN_MARGIN	=	2.0		# Seconds a car must gain before a call changes car
+
+
+################################################################################
+# Description	: Dispatcher for the hall calls of a group of cars.
+# Input		: @cars    = list of liftctl.LiftController, one per car
+#		  @outputs = output mapping showing the hall call LEDs
+#			     (only its call() is used), or None
+#		  @verbose = print assignments on stdout
+# Note		: "served", if set, is called as callback(car, floor, stamp)
+#		  when a car serves a hall call (stamp = time of the call);
+#		  "stopped", if set, as callback(car, floor) at every stop.
+#		  Stops asked for from inside a car go through carCall() so
+#		  they are never moved to another car.
+################################################################################
+class GroupDispatcher(object):
+
+	def __init__(self, cars, outputs=None, verbose=False):
+		self.cars = cars
+		self.outputs = outputs
+		self.verbose = verbose
+		self.hall = {}						# floor -> [car, time of the call]
+		self.car_calls = set()					# (car, floor) of every pending car call
+		self.served = None
+		self.stopped = None
+		for car in cars:
+			car.moved = self.carMoved
+			car.stopped = self.carStopped
+
+	# Accept a hall call to floor (stamp = time of the button press, if known)
+	def call(self, floor, stamp=None):
+		if floor in self.hall:
+			return						# Already assigned to a car
+		car, cost = self.best(floor)
+		self.hall[floor] = [car, stamp]
+		if self.outputs is not None:
+			self.outputs.call(floor, True)
+		if self.verbose:
+			print "Floor #%d call assigned to %s" % (floor, car.name)
+		car.call(floor, stamp)
+		return
+
+	# Accept a call to floor from inside car
+	def carCall(self, car, floor, stamp=None):
+		self.car_calls.add((car, floor))
+		car.call(floor, stamp)
+		return
+
+	# Car with the lowest estimated time to serve floor
+	def best(self, floor, exclude=None):
+		best = None
+		cost = None
+		for car in self.cars:
+			if car is exclude:
+				continue
+			t = car.estimate(floor)
+			if cost is None or t < cost:
+				best, cost = car, t
+		return best, cost
+
+	def carMoved(self, car, floor):
+		self.reassign()
+		return
+
+	def carStopped(self, car, floor):
+		self.car_calls.discard((car, floor))
+		if floor in self.hall and self.hall[floor][0] is car:
+			stamp = self.hall.pop(floor)[1]
+			if self.outputs is not None:
+				self.outputs.call(floor, False)
+			if self.served is not None:
+				self.served(car, floor, stamp)
+		if self.stopped is not None:
+			self.stopped(car, floor)
+		self.reassign()
+		return
+
+	# Move each hall call to another car if that car would now be there sooner
+	def reassign(self):
+		if len(self.cars) < 2:
+			return
+		for floor, assigned in self.hall.items():
+			car, stamp = assigned
+			if car.floor == floor or (car, floor) in self.car_calls:
+				continue					# Car stops there anyway
+			other, cost = self.best(floor, exclude=car)
+			if cost + REASSIGN_MARGIN < car.estimate(floor):
+				if self.verbose:
+					print "Floor #%d call moved from %s to %s" % (floor, car.name, other.name)
+				car.cancel(floor)
+				assigned[0] = other
+				other.call(floor, stamp)
+		return
+
+
+################################################################################
+# Description	: Build a group of cars which only exist in software, to run
+#		  buildings larger than the demo board.
+# Input		: @loop   = liftloop.EventLoop the cars run on
+#		  @cars   = number of cars
+#		  @floors = number of floors (the cars start spread over them)
+#		  @policy = dispatch policy of each car (see liftsched.POLICIES)
+#		  @timing = dict of timings of the cars (see LiftController),
+#			    plus "chase_time", the time of one direction chase
+# Return	: GroupDispatcher of the cars
+################################################################################
+def makeGroup (loop, cars, floors, policy="look", verbose=False, timing=None):
+	timing = timing or {}
+	group = []
+	for i in range(cars):
+		group.append(liftctl.LiftController(loop, liftctl.NullOutputs(timing.get("chase_time", liftctl.CHASE_TIME)),
+						    floor=(i * (floors - 1)) // max(cars - 1, 1),
+						    policy=policy, name="CAR%d" % i, verbose=verbose,
+						    timing=timing))
+	return GroupDispatcher(group, verbose=verbose)
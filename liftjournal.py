@@ -0,0 +1,212 @@
+#!/usr/bin/python
+##########################################################
+## Binary event journal of the lift
+##
+## Every event of the cars (calls, departures, floors
+## passed, arrivals, ...) and every LED change is stored
+## as one fixed-size record:
+##	time (double), event, car, floor, value
+## in a ring of preallocated segment files of a journal
+## directory. The writer maps the current segment and
+## packs records straight into the mapping: an event
+## costs no system call and survives a crash of the
+## program. The reader maps the segments read-only and
+## unpacks the records in place, oldest first.
+##
+## Usage: liftjournal.py [--summary] DIR
+##########################################################
+
+import os
+import sys
+import glob
+import mmap
+import time
+import errno
+import struct
+import argparse
+import collections
+
+
+HEADER	=	struct.Struct("<4sHHQ")		# magic, version, record size, sequence number of the segment
+RECORD	=	struct.Struct("<dBBhi")		# time, event, car, floor, value
+MAGIC	=	"LJRN"
+VERSION	=	1
+
+# Event types (0 marks the unused end of a segment)
+CALL	=	1		# floor became a pending stop
+CANCEL	=	2		# pending stop dropped
+DEPART	=	3		# car leaves for floor, value = direction
+FLOOR	=	4		# car passed/reached floor, value = direction
+ARRIVE	=	5		# car serves the stop at floor
+IDLE	=	6		# car has no stops left
+LED_ON	=	7		# LED turned ON, value = GPIO PIN
+LED_OFF	=	8		# LED turned OFF, value = GPIO PIN
+
+EVENTS = {
+	"call":		CALL,
+	"cancel":	CANCEL,
+	"depart":	DEPART,
+	"floor":	FLOOR,
+	"stop":		ARRIVE,
+	"idle":		IDLE,
+}
+
+NAMES = {CALL: "call", CANCEL: "cancel", DEPART: "depart", FLOOR: "floor",
+	 ARRIVE: "arrive", IDLE: "idle", LED_ON: "led_on", LED_OFF: "led_off"}
+
+
+def segmentPath (directory, index):
+	return os.path.join(directory, "%03d.seg" % index)
+
+
+################################################################################
+# Description	: Writer of a journal directory; also a liftctl listener, so
+#		  it can be put in LiftController.listeners.
+# Input		: @directory = journal directory (created if needed)
+#		  @records   = records per segment file
+#		  @segments  = segment files in the ring; the oldest one is
+#			       reused when the current one is full
+#		  @clock     = function giving the time of LED changes
+# Note		: A new run starts on the segment after the newest one, so
+#		  the trace of the previous run is kept.
+################################################################################
+class Journal(object):
+
+	def __init__(self, directory, records=4096, segments=8, clock=time.time):
+		self.directory = directory
+		self.records = records
+		self.segments = segments
+		self.clock = clock
+		self.size = HEADER.size + records * RECORD.size
+		self.cars = {}						# car -> number in the records
+		self.map = None
+		self.pos = 0
+		try:
+			os.makedirs(directory)
+		except OSError as e:
+			if e.errno != errno.EEXIST:
+				raise
+		seqs = [seq for seq, path in readHeaders(directory)]
+		self.seq = max(seqs) + 1 if seqs else 0
+		self._open()
+
+	# Map the segment of sequence number self.seq, cleared
+	def _open(self):
+		self.close()
+		fd = os.open(segmentPath(self.directory, self.seq % self.segments), os.O_RDWR | os.O_CREAT, 0644)
+		os.ftruncate(fd, 0)					# Drop the old records of a reused segment
+		os.ftruncate(fd, self.size)				# Preallocate: reads back as zeros
+		self.map = mmap.mmap(fd, self.size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+		os.close(fd)
+		HEADER.pack_into(self.map, 0, MAGIC, VERSION, RECORD.size, self.seq)
+		self.pos = HEADER.size
+		return
+
+	def write(self, stamp, event, car, floor, value=0):
+		if self.pos >= self.size:
+			self.seq += 1
+			self._open()
+		RECORD.pack_into(self.map, self.pos, stamp, event, car, floor, value)
+		self.pos += RECORD.size
+		return
+
+	def led(self, gpio, val):
+		self.write(self.clock(), LED_ON if val == "1" else LED_OFF, 0, -1, int(gpio))
+		return
+
+	def __call__(self, car, event, floor):
+		num = self.cars.get(car)
+		if num is None:
+			num = self.cars[car] = len(self.cars)
+		self.write(car.loop.wallTime(), EVENTS[event], num, floor, car.direction)
+		return
+
+	def flush(self):
+		if self.map is not None:
+			self.map.flush()
+		return
+
+	def close(self):
+		if self.map is not None:
+			self.map.close()
+			self.map = None
+		return
+
+
+################################################################################
+# Description	: Sequence numbers of the segments of a journal directory.
+# Return	: List of (sequence number, path), oldest first
+################################################################################
+def readHeaders (directory):
+	found = []
+	for path in glob.glob(os.path.join(directory, "*.seg")):
+		fo = open(path, "rb")
+		head = fo.read(HEADER.size)
+		fo.close()
+		if len(head) == HEADER.size:
+			magic, version, size, seq = HEADER.unpack(head)
+			if magic == MAGIC and version == VERSION and size == RECORD.size:
+				found.append((seq, path))
+	found.sort()
+	return found
+
+
+################################################################################
+# Description	: Reader of a journal directory.
+#		  Iterating over it gives the records of all the segments as
+#		  (time, event, car, floor, value) tuples, oldest first. The
+#		  segments are memory mapped read-only and unpacked in place.
+################################################################################
+class JournalReader(object):
+
+	def __init__(self, directory):
+		self.maps = []
+		for seq, path in readHeaders(directory):
+			fo = open(path, "rb")
+			size = os.fstat(fo.fileno()).st_size
+			if size > HEADER.size:
+				self.maps.append(mmap.mmap(fo.fileno(), size, access=mmap.ACCESS_READ))
+			fo.close()
+
+	def __iter__(self):
+		for m in self.maps:
+			for pos in xrange(HEADER.size, len(m) - RECORD.size + 1, RECORD.size):
+				rec = RECORD.unpack_from(m, pos)
+				if rec[1] == 0:
+					break				# Unused end of the segment
+				yield rec
+
+	# Return : dict of the number of records per (event name, floor)
+	def summary(self):
+		counts = collections.defaultdict(int)
+		for stamp, event, car, floor, value in self:
+			counts[(NAMES.get(event, str(event)), floor)] += 1
+		return counts
+
+	def close(self):
+		for m in self.maps:
+			m.close()
+		self.maps = []
+		return
+
+
+def main (argv):
+	parser = argparse.ArgumentParser(description="Dump a lift event journal")
+	parser.add_argument("--summary", action="store_true", help="count the records per event and floor")
+	parser.add_argument("directory")
+	args = parser.parse_args(argv)
+
+	reader = JournalReader(args.directory)
+	if args.summary:
+		counts = reader.summary()
+		for event, floor in sorted(counts):
+			print "%-8s %3d %d" % (event, floor, counts[(event, floor)])
+	else:
+		for stamp, event, car, floor, value in reader:
+			print "%.6f %-8s car %d floor %d value %d" % (stamp, NAMES.get(event, str(event)), car, floor, value)
+	reader.close()
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
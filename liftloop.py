@@ -0,0 +1,276 @@
+##########################################################
+## Event loop for the Lift Operation Simulation
+##
+## A small epoll based loop with timers and generator
+## coroutines, so that button presses, direction
+## animation, floor travel and door dwell can all be in
+## progress at the same time without blocking each other.
+## Timers run on the monotonic clock: the board has no
+## battery-backed clock, and NTP setting the wall clock
+## after boot must not fire or freeze the pending timers.
+##########################################################
+
+import os
+import time
+import heapq
+import errno
+import ctypes
+import ctypes.util
+import select
+import types
+
+
+CLOCK_MONOTONIC	=	1		# clock_gettime() clock id (linux/time.h)
+
+
+class timespec(ctypes.Structure):
+	_fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+
+_librt = ctypes.CDLL(ctypes.util.find_library("rt") or "librt.so.1", use_errno=True)
+_clock_gettime = _librt.clock_gettime
+_clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+
+
+################################################################################
+# Description	: Seconds of the monotonic clock (Python 2.7 has no
+#		  time.monotonic()); only differences between two values
+#		  mean anything.
+################################################################################
+def monotonic ():
+	ts = timespec()
+	if _clock_gettime(CLOCK_MONOTONIC, ctypes.byref(ts)) != 0:
+		e = ctypes.get_errno()
+		raise OSError(e, os.strerror(e))
+	return ts.tv_sec + ts.tv_nsec * 1e-9
+
+
+################################################################################
+# Description	: A callback scheduled on the loop at an absolute time.
+#		  cancel() keeps it from running; it stays in the timer heap
+#		  and is dropped when its time comes.
+################################################################################
+class Timer(object):
+
+	def __init__(self, when, callback, args):
+		self.when = when
+		self.callback = callback
+		self.args = args
+		self.cancelled = False
+
+	def cancel(self):
+		self.cancelled = True
+		return
+
+
+################################################################################
+# Description	: A coroutine (generator) running on the loop.
+#		  The generator yields
+#			a number	- sleep for that many seconds
+#			a generator	- run it as a sub-coroutine and resume
+#					  when it is finished
+#		  cancel() closes the generator(s) and stops the task. Called
+#		  from inside the task itself (e.g. by a callback its coroutine
+#		  runs), it only marks the task: a running generator can not
+#		  be closed, so the task stops at its next yield.
+################################################################################
+class Task(object):
+
+	def __init__(self, loop, coro):
+		self.loop = loop
+		self.stack = [coro]
+		self.done = False
+		self.running = False					# Inside step()
+		self.timer = loop.callLater(0, self.step)
+
+	def step(self):
+		self.timer = None
+		self.running = True
+		while self.stack and not self.done:
+			try:
+				res = self.stack[-1].send(None)
+			except StopIteration:
+				self.stack.pop()
+				continue
+			if isinstance(res, types.GeneratorType):
+				self.stack.append(res)
+				continue
+			if not self.done:
+				self.timer = self.loop.callLater(res or 0, self.step)
+				self.running = False
+				return
+		self.running = False
+		self.cancel()
+		return
+
+	def cancel(self):
+		self.done = True
+		if self.running:
+			return						# step() closes it at the next yield
+		if self.timer is not None:
+			self.timer.cancel()
+			self.timer = None
+		while self.stack:
+			self.stack.pop().close()
+		return
+
+
+################################################################################
+# Description	: The event loop.
+#		  addReader() watches a descriptor with epoll and calls
+#		  callback(fd, events) when it is ready; callLater()/callAt()
+#		  run a callback after a delay / at a given time and spawn()
+#		  starts a coroutine as a Task.
+#		  run() keeps going until stop() is called.
+#		  time() is the monotonic clock all timers run on; wallTime()
+#		  is the time of day, for what has to be stamped with it
+#		  (demand per hour of the day, the event journal).
+# Note		: For the GPIO "value" files of the buttons pass
+#		  events=select.EPOLLPRI (edge interrupts are signalled as
+#		  an exceptional condition, not as readable data).
+################################################################################
+class EventLoop(object):
+
+	def __init__(self):
+		self.epoll = select.epoll()
+		self.readers = {}					# fd -> callback
+		self.timers = []					# heap of (time, seq, Timer)
+		self.seq = 0						# keeps timers with the same time in FIFO order
+		self.events = 0						# Callbacks run so far
+		self.running = False
+
+	def time(self):
+		return monotonic()
+
+	def wallTime(self):
+		return time.time()
+
+	def addReader(self, fd, callback, events=select.EPOLLIN):
+		self.readers[fd] = callback
+		self.epoll.register(fd, events)
+		return
+
+	# Change the epoll events a descriptor is watched for
+	def modifyReader(self, fd, events):
+		self.epoll.modify(fd, events)
+		return
+
+	def removeReader(self, fd):
+		if self.readers.pop(fd, None) is not None:
+			self.epoll.unregister(fd)
+		return
+
+	def callAt(self, when, callback, *args):
+		self.seq += 1
+		timer = Timer(when, callback, args)
+		heapq.heappush(self.timers, (when, self.seq, timer))
+		return timer
+
+	def callLater(self, delay, callback, *args):
+		return self.callAt(self.time() + delay, callback, *args)
+
+	def spawn(self, coro):
+		return Task(self, coro)
+
+	# Wait for the first descriptor event or due timer and run what is ready
+	def runOnce(self):
+		while self.timers and self.timers[0][2].cancelled:
+			heapq.heappop(self.timers)
+		timeout = -1
+		if self.timers:
+			timeout = max(0, self.timers[0][0] - self.time())
+		try:
+			events = self.epoll.poll(timeout)
+		except IOError as e:
+			if e.errno != errno.EINTR:
+				raise
+			events = []
+		for fd, event in events:
+			callback = self.readers.get(fd)
+			if callback is not None:
+				self.events += 1
+				callback(fd, event)
+		now = self.time()
+		while self.timers and self.timers[0][0] <= now:
+			timer = heapq.heappop(self.timers)[2]
+			if not timer.cancelled:
+				self.events += 1
+				timer.callback(*timer.args)
+		return
+
+	def run(self):
+		self.running = True
+		while self.running:
+			self.runOnce()
+		return
+
+	def stop(self):
+		self.running = False
+		return
+
+	def close(self):
+		self.epoll.close()
+		return
+
+
+################################################################################
+# Description	: Discrete-event version of the loop, on a virtual clock.
+#		  time() (and wallTime()) is the time of the event being run;
+#		  runOnce() jumps straight to the next timer instead of
+#		  sleeping, so the same coroutines run as fast as the CPU
+#		  allows.
+#		  run() keeps going until there are no timers left, stop() is
+#		  called or the clock passes "until".
+# Note		: There are no descriptors to wait for; events from outside
+#		  (e.g. button presses) are put on the loop with callAt().
+################################################################################
+class SimLoop(EventLoop):
+
+	def __init__(self, start=0.0):
+		self.now = start
+		self.readers = {}
+		self.timers = []
+		self.seq = 0
+		self.events = 0
+		self.running = False
+
+	def time(self):
+		return self.now
+
+	def wallTime(self):
+		return self.now
+
+	def addReader(self, fd, callback, events=select.EPOLLIN):
+		raise ValueError("SimLoop can not watch descriptors")
+
+	def removeReader(self, fd):
+		return
+
+	# Run the next timer; Return : False if there is none left
+	def runOnce(self):
+		while self.timers:
+			timer = heapq.heappop(self.timers)[2]
+			if not timer.cancelled:
+				if timer.when > self.now:
+					self.now = timer.when
+				self.events += 1
+				timer.callback(*timer.args)
+				return True
+		return False
+
+	def run(self, until=None):
+		self.running = True
+		while self.running:
+			if until is not None:
+				while self.timers and self.timers[0][2].cancelled:
+					heapq.heappop(self.timers)
+				if not self.timers or self.timers[0][0] > until:
+					self.now = max(self.now, until)
+					break
+			if not self.runOnce():
+				break
+		self.running = False
+		return
+
+	def close(self):
+		return
@@ -0,0 +1,162 @@
+##########################################################
+## Demand-predictive idle parking of the lift
+##
+## DemandModel keeps, for each part of the day, a rolling
+## histogram of the floors the calls come from (older
+## calls fade out). IdleParker watches a car: once it has
+## been idle for "idle_time" seconds, it parks the car at
+## the floor with the least expected travel to the next
+## call of that time of day, i.e. the weighted median of
+## the histogram, and looks again every "idle_time" while
+## the car stays idle. The parkers of a group split the
+## histogram between the k cars of the group: each car
+## covers the floor at the middle of one of k equal shares
+## of the calls. A busy car covers the share floor nearest
+## to it, the idle cars take the others in the order they
+## are in, so no two of them wait at the same floor. A real
+## call stops the move at once (see LiftController.park()).
+##########################################################
+
+DAY	=	86400.0		# Seconds per day
+
+
+################################################################################
+# Description	: Time-of-day histograms of the floors of the calls.
+# Input		: @floors  = number of floors
+#		  @buckets = parts the day is split into (24 = one per hour)
+#		  @memory  = calls of a bucket after which an old call
+#			     weighs about 1/e of a new one
+#		  @offset  = seconds added to the loop wallTime() to get the
+#			     local time of day (e.g. -time.timezone on the board)
+################################################################################
+class DemandModel(object):
+
+	def __init__(self, floors, buckets=24, memory=200, offset=0.0):
+		self.floors = floors
+		self.buckets = buckets
+		self.decay = 1.0 - 1.0 / memory
+		self.offset = offset
+		self.counts = [[0.0] * floors for i in range(buckets)]
+
+	def bucket(self, when):
+		return int((when + self.offset) % DAY * self.buckets / DAY) % self.buckets
+
+	def record(self, floor, when):
+		row = self.counts[self.bucket(when)]
+		for i in range(self.floors):
+			row[i] *= self.decay
+		row[floor] += 1.0
+		return
+
+	# Floor minimising the expected distance to the next call at time when
+	# Return : floor number, or None without enough calls to go by
+	def best(self, when, min_calls=5.0):
+		floors = self.spread(when, 1, min_calls)
+		return floors[0] if floors else None
+
+	# Distinct floors for k cars waiting for the next call at time when: the
+	# weighted median of each of k equal shares of the calls
+	# Return : list of up to k floors, bottom to top, or None without
+	#	   enough calls to go by
+	def spread(self, when, k, min_calls=5.0):
+		row = self.counts[self.bucket(when)]
+		total = sum(row)
+		if total < min_calls:
+			return None
+		k = min(k, self.floors)
+		floors = []
+		seen = 0.0
+		floor = 0
+		for j in range(k):
+			share = total * (2 * j + 1) / (2 * k)
+			while floor < self.floors - 1 and seen + row[floor] < share:
+				seen += row[floor]
+				floor += 1
+			floors.append(floor)
+		for j in range(k - 1, -1, -1):				# Shares on the same floor: spread them
+			top = self.floors - k + j
+			if floors[j] > top:
+				floors[j] = top
+			if j > 0 and floors[j - 1] >= floors[j]:
+				floors[j - 1] = floors[j] - 1
+		return floors
+
+
+################################################################################
+# Description	: Parks a car after it has been idle for a while; a
+#		  liftctl listener which adds itself to car.listeners.
+# Input		: @loop      = liftloop.EventLoop the car runs on
+#		  @car       = liftctl.LiftController
+#		  @model     = DemandModel fed with the calls of the car (it
+#			       can be shared by several cars)
+#		  @idle_time = seconds idle before parking
+#		  @record    = feed the calls of the car to the model; False
+#			       when the owner of the model records the calls
+#			       itself (e.g. once per hall call of a group,
+#			       which a reassignment hands to a second car)
+#		  @group     = list shared by the parkers of the cars of a
+#			       group (the parker adds itself), or None for a
+#			       car of its own
+################################################################################
+class IdleParker(object):
+
+	def __init__(self, loop, car, model, idle_time=30.0, record=True, group=None):
+		self.loop = loop
+		self.car = car
+		self.model = model
+		self.idle_time = idle_time
+		self.record = record
+		self.group = group if group is not None else []
+		self.group.append(self)
+		self.target = car.floor					# Floor the car was last sent to
+		self.timer = None
+		car.listeners.append(self)
+		if car.idle():
+			self.timer = loop.callLater(idle_time, self.park)
+
+	def __call__(self, car, event, floor):
+		if event == "call" and self.record:
+			self.model.record(floor, self.loop.wallTime())
+		if self.timer is not None:
+			self.timer.cancel()
+			self.timer = None
+		if event == "idle":
+			self.timer = self.loop.callLater(self.idle_time, self.park)
+		return
+
+	# Floor the idle car is at, or is being parked at
+	def place(self):
+		return self.target if self.car.parking is not None else self.car.floor
+
+	def park(self):
+		self.timer = self.loop.callLater(self.idle_time, self.park)	# Look again while the car stays idle
+		if not self.car.idle():
+			return
+		floors = self.model.spread(self.loop.wallTime(), len(self.group))
+		if floors is None:
+			return
+		idle = []
+		for parker in self.group:
+			if parker.car.idle():
+				idle.append(parker)
+			elif floors:					# Busy car: covers the share it is nearest to
+				floors.remove(min(floors, key=lambda floor: abs(floor - parker.car.floor)))
+		if not floors:
+			return
+		# Idle cars take the other floors in the order they are in (least travel)
+		idle.sort(key=lambda parker: parker.place())
+		floor = floors[min(idle.index(self), len(floors) - 1)]
+		if floor != self.place():
+			self.target = floor
+			self.car.park(floor)
+		return
+
+	def close(self):
+		if self.timer is not None:
+			self.timer.cancel()
+			self.timer = None
+		if self in self.car.listeners:
+			self.car.listeners.remove(self)
+		if self in self.group:
+			self.group.remove(self)
+		return
@@ -0,0 +1,96 @@
+##########################################################
+## Precompiled motion plans of the lift
+##
+## A trip from one floor to another is compiled once into
+## a flat, timed plan: a tuple of (offset, action, arg)
+## where offset is seconds from the start of the trip:
+##	FRAME	- show an LED frame (direction chase step)
+##	MOVE	- car reaches floor arg (position LEDs)
+##	CHECK	- end of the stay at floor arg: the target can
+##		  change here (a new call on the way)
+## PlanCache keeps the plans of the recent trips, keyed by
+## (origin, destination, direction). replay() runs a plan
+## against absolute deadlines from the start of the trip,
+## so the waits do not add up drift over a long trip.
+##########################################################
+
+import collections
+
+import liftstats
+
+
+FRAME	=	0
+MOVE	=	1
+CHECK	=	2
+
+
+################################################################################
+# Description	: Compile the plan of a trip.
+# Input		: @origin     = floor of departure
+#		  @dest       = floor of arrival (not origin)
+#		  @chase      = function(step) giving the direction chase batch,
+#				a list of (frame, hold), for step +1/-1
+#		  @step_pause = pause between the chase and the floor move
+#		  @floor_time = time spent at each floor reached
+# Return	: Tuple of (offset, action, arg), in time order
+################################################################################
+def compilePlan (origin, dest, chase, step_pause, floor_time):
+	step = 1 if dest > origin else -1
+	batch = chase(step)
+	plan = []
+	t = 0.0
+	for floor in range(origin + step, dest + step, step):
+		for frame, hold in batch:
+			plan.append((t, FRAME, frame))
+			t += hold
+		t += step_pause
+		plan.append((t, MOVE, floor))
+		t += floor_time
+		plan.append((t, CHECK, floor))
+	return tuple(plan)
+
+
+################################################################################
+# Description	: Bounded cache of trip plans, least recently used out first.
+# Input		: @compile = function(origin, dest) compiling a plan
+#		  @size    = plans kept at most
+################################################################################
+class PlanCache(object):
+
+	def __init__(self, compile, size=64):
+		self.compile = compile
+		self.size = size
+		self.plans = collections.OrderedDict()			# (origin, dest, direction) -> plan
+
+	def get(self, origin, dest):
+		key = (origin, dest, 1 if dest > origin else -1)
+		plan = self.plans.pop(key, None)
+		if plan is None:
+			liftstats.counters["plan.miss"] += 1
+			plan = self.compile(origin, dest)
+			if len(self.plans) >= self.size:
+				self.plans.popitem(last=False)
+		else:
+			liftstats.counters["plan.hit"] += 1
+		self.plans[key] = plan
+		return plan
+
+
+################################################################################
+# Description	: Coroutine running a plan (see liftloop.Task).
+# Input		: @loop  = liftloop.EventLoop
+#		  @plan  = plan from compilePlan()
+#		  @start = absolute time of offset 0
+#		  @apply = function(action, arg, deadline) doing one action;
+#			   returns False to stop the plan there
+# Note		: The lateness of every action is recorded as "plan_lag".
+################################################################################
+def replay (loop, plan, start, apply):
+	for offset, action, arg in plan:
+		deadline = start + offset
+		delay = deadline - loop.time()
+		if delay > 0:
+			yield delay
+		liftstats.record("plan_lag", loop.time() - deadline)
+		if not apply(action, arg, deadline):
+			return
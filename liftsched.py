@@ -0,0 +1,135 @@
+##########################################################
+## Call scheduling for the lift
+##
+## Keeps the set of pending floor calls and decides, with
+## a pluggable dispatch policy, which floor the car heads
+## for next. The target is asked for again at every floor
+## so calls made while the car moves are picked up on the
+## way when the policy allows it.
+##########################################################
+
+import collections
+
+
+################################################################################
+# Description	: First come first served: always head for the oldest call,
+#		  passing other called floors without stopping.
+################################################################################
+class FcfsPolicy(object):
+
+	name = "fcfs"
+
+	def target(self, pending, floor, direction):
+		for call in pending:
+			return call
+		return None
+
+
+################################################################################
+# Description	: SCAN/LOOK: keep going in the current direction while there
+#		  are calls ahead of the car, stopping at each of them, then
+#		  turn round. An idle car heads for the nearest call.
+################################################################################
+class LookPolicy(object):
+
+	name = "look"
+
+	def target(self, pending, floor, direction):
+		if not pending:
+			return None
+		if floor in pending:
+			return floor
+		if direction > 0:
+			ahead = [call for call in pending if call > floor]
+			if ahead:
+				return min(ahead)
+		elif direction < 0:
+			ahead = [call for call in pending if call < floor]
+			if ahead:
+				return max(ahead)
+		return nearestCall(pending, floor)
+
+
+################################################################################
+# Description	: Nearest first: always head for the closest call.
+################################################################################
+class NearestPolicy(object):
+
+	name = "nearest"
+
+	def target(self, pending, floor, direction):
+		if not pending:
+			return None
+		return nearestCall(pending, floor)
+
+
+################################################################################
+# Description	: Closest call to floor; on a tie the older call wins.
+# Input		: @pending = pending calls in arrival order
+#		  @floor   = current floor of the car
+# Return	: Floor number of the call
+################################################################################
+def nearestCall (pending, floor):
+	best = None
+	for call in pending:
+		if best is None or abs(call - floor) < abs(best - floor):
+			best = call
+	return best
+
+
+POLICIES = {
+	FcfsPolicy.name:	FcfsPolicy,
+	LookPolicy.name:	LookPolicy,
+	NearestPolicy.name:	NearestPolicy,
+}
+
+
+################################################################################
+# Description	: Set of pending calls with a dispatch policy.
+#		  pending maps floor -> time of the first call to it, in
+#		  arrival order; a second call to a pending floor is merged.
+# Input		: @policy = name of the dispatch policy (see POLICIES)
+################################################################################
+class CallScheduler(object):
+
+	def __init__(self, policy="fcfs"):
+		self.policy = POLICIES[policy]()
+		self.pending = collections.OrderedDict()
+
+	def __len__(self):
+		return len(self.pending)
+
+	def __contains__(self, floor):
+		return floor in self.pending
+
+	# Add a call; Return : True if the floor was not pending yet
+	def add(self, floor, stamp=None):
+		if floor in self.pending:
+			return False
+		self.pending[floor] = stamp
+		return True
+
+	# Remove a served call; Return : time of the call (None if it was not pending)
+	def remove(self, floor):
+		return self.pending.pop(floor, None)
+
+	# Floor the car at floor, moving in direction (+1/-1/0), should head for
+	def target(self, floor, direction):
+		return self.policy.target(self.pending, floor, direction)
+
+	# Order in which the pending calls (plus the call extra, if given) would be
+	# served by a car at floor moving in direction, if no other call came in
+	# Return : list of floors
+	def route(self, floor, direction, extra=None):
+		pending = list(self.pending)
+		if extra is not None and extra not in self.pending:
+			pending.append(extra)
+		stops = []
+		while pending:
+			stop = self.policy.target(pending, floor, direction)
+			if stop != floor:
+				direction = 1 if stop > floor else -1
+			pending.remove(stop)
+			stops.append(stop)
+			floor = stop
+		return stops
@@ -0,0 +1,245 @@
+##########################################################
+## Control and telemetry server of the lift
+##
+## A socket server (Unix or TCP) on the event loop with a
+## line protocol; every line ends with "\n".
+## Client to server:
+##	CALL <floor>	- place a call, answered "OK" or "ERR ..."
+##	STATE		- one "STATE" line
+##	SUB / UNSUB	- start / stop the event stream
+##	QUIT		- close the connection once the replies
+##			  already queued are sent
+## Server to client:
+##	STATE <floor> <direction> <pending calls, "," separated or "-">
+##	EV <time> <event> <floor> <direction>
+##			- one per listener event of the car (see
+##			  liftctl.LiftController), after a first STATE
+##	DROPPED <n>	- n lines were lost before this one
+## Each client has a bounded output buffer. When a slow
+## client lets it fill up the oldest lines are dropped, so
+## the controller never waits for a client: a car event
+## only formats one line and queues it.
+##########################################################
+
+import os
+import errno
+import socket
+import select
+import collections
+
+from liftstats import counters
+
+
+MAX_CLIENTS	=	64		# Connections beyond this are refused
+MAX_LINE	=	128		# Longest request line accepted
+BUFFER_LINES	=	256		# Lines queued per client before the oldest are dropped
+
+
+################################################################################
+# Description	: One connection of the server.
+################################################################################
+class Client(object):
+
+	def __init__(self, server, sock, maxlen):
+		self.server = server
+		self.sock = sock
+		self.fd = sock.fileno()
+		self.lines = collections.deque(maxlen=maxlen)		# Whole lines waiting to be sent
+		self.out = ""						# Part of a line already being sent
+		self.inbuf = ""
+		self.dropped = 0					# Lines dropped since the last DROPPED notice
+		self.subscribed = False
+		self.writing = False					# Watched for EPOLLOUT
+		self.closing = False					# QUIT received: close once all is sent
+
+	def queue(self, line):
+		if self.closing:
+			return
+		if len(self.lines) == self.lines.maxlen:
+			self.dropped += 1				# deque drops the oldest line
+			counters["server.dropped"] += 1
+		self.lines.append(line)
+		if not self.writing:
+			self.writing = True
+			self.server.loop.modifyReader(self.fd, select.EPOLLIN | select.EPOLLOUT)
+		return
+
+	def _onEvent(self, fd, events):
+		if events & (select.EPOLLERR | select.EPOLLHUP):
+			self.server.drop(self)
+			return
+		if events & select.EPOLLIN and not self._read():
+			return
+		if events & select.EPOLLOUT:
+			self._write()
+		return
+
+	# Return : False if the client is gone
+	def _read(self):
+		try:
+			data = self.sock.recv(4096)
+		except socket.error as e:
+			if e.errno in (errno.EAGAIN, errno.EINTR):
+				return True
+			data = ""
+		if not data:
+			self.server.drop(self)
+			return False
+		self.inbuf += data
+		while "\n" in self.inbuf:
+			line, self.inbuf = self.inbuf.split("\n", 1)
+			if not self.server.request(self, line.strip()):
+				return False
+		if len(self.inbuf) > MAX_LINE:
+			self.server.drop(self)
+			return False
+		return True
+
+	def _write(self):
+		if not self.out:
+			if self.dropped:
+				self.out = "DROPPED %d\n" % self.dropped
+				self.dropped = 0
+			self.out += "".join(self.lines)
+			self.lines.clear()
+		try:
+			sent = self.sock.send(self.out)
+		except socket.error as e:
+			if e.errno in (errno.EAGAIN, errno.EINTR):
+				return
+			self.server.drop(self)
+			return
+		self.out = self.out[sent:]
+		if not self.out and not self.lines:
+			if self.closing:
+				self.server.drop(self)
+				return
+			self.writing = False
+			self.server.loop.modifyReader(self.fd, select.EPOLLIN)
+		return
+
+	# Close after the queued lines are sent, reading nothing more meanwhile
+	def quit(self):
+		self.closing = True
+		if not self.writing:
+			self.server.drop(self)
+			return
+		self.server.loop.modifyReader(self.fd, select.EPOLLOUT)
+		return
+
+	def close(self):
+		self.server.loop.removeReader(self.fd)
+		self.sock.close()
+		return
+
+
+################################################################################
+# Description	: Control and telemetry server of one car.
+# Input		: @loop    = liftloop.EventLoop
+#		  @lift    = liftctl.LiftController
+#		  @address = Unix socket path, or (host, port) for TCP
+#		  @floors  = number of floors (CALL range check)
+#		  @call    = function(floor, stamp) placing a call (default
+#			     lift.call)
+#		  @buffer  = lines queued per client (see BUFFER_LINES)
+# Note		: The server adds itself to lift.listeners.
+################################################################################
+class ControlServer(object):
+
+	def __init__(self, loop, lift, address, floors, call=None, buffer=BUFFER_LINES):
+		self.loop = loop
+		self.lift = lift
+		self.address = address
+		self.floors = floors
+		self.call = call or lift.call
+		self.buffer = buffer
+		self.clients = {}					# fd -> Client
+		if isinstance(address, tuple):
+			self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+			self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		else:
+			try:
+				os.unlink(address)
+			except OSError as e:
+				if e.errno != errno.ENOENT:
+					raise
+			self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.sock.bind(address)
+		self.sock.listen(16)
+		self.sock.setblocking(False)
+		loop.addReader(self.sock.fileno(), self._accept)
+		lift.listeners.append(self)
+
+	def _accept(self, fd, events):
+		try:
+			conn, addr = self.sock.accept()
+		except socket.error:
+			return
+		if len(self.clients) >= MAX_CLIENTS:
+			counters["server.refused"] += 1
+			conn.close()
+			return
+		conn.setblocking(False)
+		client = Client(self, conn, self.buffer)
+		self.clients[client.fd] = client
+		self.loop.addReader(client.fd, client._onEvent, select.EPOLLIN)
+		counters["server.accepted"] += 1
+		return
+
+	def state(self):
+		pending = ",".join(str(floor) for floor in self.lift.calls.pending) or "-"
+		return "STATE %d %d %s\n" % (self.lift.floor, self.lift.direction, pending)
+
+	# Handle one request line; Return : False if the client is gone
+	def request(self, client, line):
+		words = line.split()
+		if not words:
+			return True
+		cmd = words[0].upper()
+		if cmd == "CALL":
+			if len(words) != 2 or not words[1].isdigit() or int(words[1]) >= self.floors:
+				client.queue("ERR bad floor\n")
+			else:
+				self.call(int(words[1]), self.loop.time())
+				client.queue("OK\n")
+		elif cmd == "STATE":
+			client.queue(self.state())
+		elif cmd == "SUB":
+			client.subscribed = True
+			client.queue(self.state())
+		elif cmd == "UNSUB":
+			client.subscribed = False
+			client.queue("OK\n")
+		elif cmd == "QUIT":
+			client.quit()
+			return False
+		else:
+			client.queue("ERR unknown command\n")
+		return True
+
+	# Listener of the car: stream the event to the subscribers
+	def __call__(self, car, event, floor):
+		line = None
+		for client in self.clients.values():
+			if client.subscribed:
+				if line is None:
+					line = "EV %.3f %s %d %d\n" % (self.loop.time(), event, floor, car.direction)
+				client.queue(line)
+		return
+
+	def drop(self, client):
+		if self.clients.pop(client.fd, None) is not None:
+			client.close()
+		return
+
+	def close(self):
+		for client in self.clients.values():
+			client.close()
+		self.clients = {}
+		if self in self.lift.listeners:
+			self.lift.listeners.remove(self)
+		self.loop.removeReader(self.sock.fileno())
+		self.sock.close()
+		if not isinstance(self.address, tuple):
+			os.unlink(self.address)
+		return
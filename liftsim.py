@@ -0,0 +1,175 @@
+#!/usr/bin/python
+##########################################################
+## Headless simulation of the lift
+##
+## Runs the same controller code (liftctl/liftgroup) on a
+## liftloop.SimLoop: every sleep of the controller is an
+## event on a virtual clock and the button presses come
+## from a generated or recorded stream of arrivals, so a
+## day of traffic takes a fraction of a second.
+##
+## Usage: liftsim.py [--cars N] [--floors M] [--policy P]
+##		     [--hours H] [--rate R] [--seed S]
+##		     [--park S] [--record FILE]
+##########################################################
+
+import sys
+import time
+import random
+import argparse
+
+import liftpark
+import liftloop
+import liftgroup
+
+
+################################################################################
+# Description	: Generated stream of calls: exponential gaps between calls
+#		  (Poisson arrivals) and a uniformly random floor for each.
+# Input		: @rate     = calls per hour
+#		  @floors   = number of floors
+#		  @duration = seconds of traffic
+#		  @seed     = seed of the random generator
+# Return	: List of (time, floor), in time order
+################################################################################
+def randomArrivals (rate, floors, duration, seed=0):
+	rnd = random.Random(seed)
+	arrivals = []
+	t = rnd.expovariate(rate / 3600.0)
+	while t < duration:
+		arrivals.append((t, rnd.randrange(floors)))
+		t += rnd.expovariate(rate / 3600.0)
+	return arrivals
+
+
+################################################################################
+# Description	: Recorded stream of calls, one "time floor" pair per line
+#		  (time in seconds from the start); "#" starts a comment.
+# Input		: @path = file name
+# Return	: List of (time, floor), in time order
+################################################################################
+def readArrivals (path):
+	arrivals = []
+	fo = open(path, "r")
+	for line in fo:
+		words = line.split("#")[0].split()
+		if len(words) >= 2:
+			arrivals.append((float(words[0]), int(words[1])))
+	fo.close()
+	arrivals.sort()
+	return arrivals
+
+
+################################################################################
+# Description	: A building of software cars on a virtual clock.
+#		  call() places a hall call now, schedule() places a whole
+#		  stream of calls, run() advances the clock until the work
+#		  is done: every call placed and served, and no car being
+#		  parked (parked cars keep looking for a better floor, so
+#		  the loop never runs out of timers by itself).
+#		  Every served call adds its wait time to "waits".
+# Input		: @cars   = number of cars
+#		  @floors = number of floors
+#		  @policy = dispatch policy of each car (see liftsched.POLICIES)
+#		  @park   = seconds idle before a car parks where calls are
+#			    likely (see liftpark), or None not to park
+################################################################################
+class Simulation(object):
+
+	def __init__(self, cars=1, floors=4, policy="look", park=None):
+		self.loop = liftloop.SimLoop()
+		self.group = liftgroup.makeGroup(self.loop, cars, floors, policy)
+		self.group.served = self.served
+		self.model = None					# Demand of the hall calls, if cars park
+		if park is not None:
+			self.model = liftpark.DemandModel(floors)
+			parkers = []					# The cars share out the floors to wait at
+			for car in self.group.cars:
+				liftpark.IdleParker(self.loop, car, self.model, park, record=False, group=parkers)
+		self.floors = floors
+		self.calls = 0						# Hall calls placed
+		self.merged = 0						# Calls to a floor which was already called
+		self.waits = []						# Wait time of each served call
+		self.end = 0.0						# Time of the last scheduled call
+
+	def call(self, floor):
+		self.calls += 1
+		if floor in self.group.hall:
+			self.merged += 1
+		elif self.model is not None:
+			self.model.record(floor, self.loop.wallTime())	# Once per hall call, not per car it goes to
+		self.group.call(floor, self.loop.time())
+		return
+
+	def schedule(self, arrivals):
+		for t, floor in arrivals:
+			self.loop.callAt(t, self.call, floor)
+			self.end = max(self.end, t)
+		return
+
+	def busy(self):
+		for car in self.group.cars:
+			if not car.idle() or (car.parking is not None and not car.parking.done):
+				return True
+		return False
+
+	def served(self, car, floor, stamp):
+		if stamp is not None:
+			self.waits.append(self.loop.time() - stamp)
+		return
+
+	def run(self, until=None):
+		if until is not None:
+			self.loop.run(until)
+			return
+		self.loop.run(self.end)
+		while self.busy() and self.loop.runOnce():
+			pass
+		return
+
+	# Return : dict of the results so far
+	def summary(self):
+		waits = sorted(self.waits)
+		return {
+			"calls":	self.calls,
+			"merged":	self.merged,
+			"served":	len(waits),
+			"avg_wait":	sum(waits) / len(waits) if waits else 0.0,
+			"max_wait":	waits[-1] if waits else 0.0,
+			"sim_time":	self.loop.time(),
+		}
+
+
+def main (argv):
+	parser = argparse.ArgumentParser(description="Headless lift simulation")
+	parser.add_argument("--cars", type=int, default=1)
+	parser.add_argument("--floors", type=int, default=4)
+	parser.add_argument("--policy", default="look")
+	parser.add_argument("--hours", type=float, default=24.0, help="hours of generated traffic")
+	parser.add_argument("--rate", type=float, default=60.0, help="generated calls per hour")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--park", type=float, help="park idle cars after this many seconds")
+	parser.add_argument("--record", help="file of recorded \"time floor\" calls instead of generated ones")
+	args = parser.parse_args(argv)
+
+	if args.record:
+		arrivals = readArrivals(args.record)
+	else:
+		arrivals = randomArrivals(args.rate, args.floors, args.hours * 3600, args.seed)
+
+	start = time.time()
+	sim = Simulation(args.cars, args.floors, args.policy, args.park)
+	sim.schedule(arrivals)
+	sim.run()
+	res = sim.summary()
+
+	print "Calls          : %d (%d served, %d merged with pending calls)" % (res["calls"], res["served"], res["merged"])
+	print "Average wait   : %.2f s" % res["avg_wait"]
+	print "Maximum wait   : %.2f s" % res["max_wait"]
+	print "Simulated time : %.0f s" % res["sim_time"]
+	print "Run time       : %.3f s" % (time.time() - start)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,122 @@
+##########################################################
+## Crash-safe state of the lift
+##
+## The state (current floor, direction and pending calls)
+## is kept in a small append-only log file, one short
+## text record per change:
+##	F <floor> <direction>	- car is at floor
+##	D <direction>		- car changed direction
+##	C <floor>		- call to floor is pending
+##	S <floor>		- call to floor served or dropped
+## Each change costs one append. Every "compact_every"
+## records the log is replaced (write + rename) by the
+## few records of the current state. A torn last record
+## (crash in the middle of a write) and any record which
+## cannot be parsed are ignored on load.
+##########################################################
+
+import os
+import errno
+
+
+################################################################################
+# Description	: State log of one car; also a liftctl listener, so it
+#		  can be put in LiftController.listeners.
+# Input		: @path          = file name of the log
+#		  @compact_every = records appended between two compactions
+################################################################################
+class StateStore(object):
+
+	def __init__(self, path, compact_every=500):
+		self.path = path
+		self.compact_every = compact_every
+		self.fd = None
+		self.records = 0					# Records appended since the last compaction
+		self.floor = None
+		self.direction = 0
+		self.pending = []					# Pending calls, in call order
+
+	def _apply(self, words):
+		if words[0] == "F" and len(words) == 3:
+			self.floor, self.direction = int(words[1]), int(words[2])
+		elif words[0] == "D" and len(words) == 2:
+			self.direction = int(words[1])
+		elif words[0] == "C" and len(words) == 2:
+			if int(words[1]) not in self.pending:
+				self.pending.append(int(words[1]))
+		elif words[0] == "S" and len(words) == 2:
+			if int(words[1]) in self.pending:
+				self.pending.remove(int(words[1]))
+		return
+
+	# Read the log back
+	# Return : dict with "floor", "direction" and "pending", or None if
+	#	   there is no saved position
+	def load(self):
+		try:
+			fo = open(self.path, "r")
+		except IOError as e:
+			if e.errno == errno.ENOENT:
+				return None
+			raise
+		data = fo.read()
+		fo.close()
+		for line in data.split("\n")[:-1]:			# Text after the last newline is a torn record
+			words = line.split()
+			if words:
+				try:
+					self._apply(words)
+				except ValueError:
+					pass				# Garbled record: skipped like a torn one
+		if self.floor is None:
+			return None
+		return {"floor": self.floor, "direction": self.direction, "pending": list(self.pending)}
+
+	# Start a new log from the state of car and append to it from now on
+	def open(self, car):
+		self.floor = car.floor
+		self.direction = car.direction
+		self.pending = list(car.calls.pending)
+		self.compact()
+		return
+
+	# Replace the log by the records of the current state
+	def compact(self):
+		lines = ["F %d %d" % (self.floor, self.direction)]
+		lines.extend(["C %d" % floor for floor in self.pending])
+		tmp = self.path + ".tmp"
+		fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0644)
+		os.write(fd, "\n".join(lines) + "\n")
+		os.fsync(fd)
+		os.close(fd)
+		os.rename(tmp, self.path)
+		if self.fd is not None:
+			os.close(self.fd)
+		self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+		self.records = 0
+		return
+
+	def append(self, record):
+		self._apply(record.split())
+		os.write(self.fd, record + "\n")
+		self.records += 1
+		if self.records >= self.compact_every:
+			self.compact()
+		return
+
+	def __call__(self, car, event, floor):
+		if event == "call":
+			self.append("C %d" % floor)
+		elif event in ("stop", "cancel"):
+			self.append("S %d" % floor)
+		elif event == "floor":
+			self.append("F %d %d" % (floor, car.direction))
+		elif event in ("depart", "idle"):
+			self.append("D %d" % car.direction)
+		return
+
+	def close(self):
+		if self.fd is not None:
+			os.close(self.fd)
+			self.fd = None
+		return
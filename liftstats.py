@@ -0,0 +1,173 @@
+##########################################################
+## Run-time statistics of the lift controller
+##
+## Fixed-size latency histograms and plain counters which
+## are cheap enough to update on every event:
+##	press_ack	- button edge wakeup until its LED is lit
+##	call_arrival	- call until the car stops at the floor
+##	animation	- one direction LED chase
+##	plan_lag	- lateness of each action of a motion plan
+##	board_init	- set up of all the PINs at start
+##	<helper>.open/.write/.read - sysfs file operations
+##			  done by each GPIO helper
+##	debounce.bounce/.level/.merged - button edges dropped
+##			  as bounce, without a pressed level, or
+##			  as a repeat of a pending call
+##	server.accepted/.refused/.dropped - control server
+##			  clients and stream lines lost to slow ones
+## StatsExporter publishes them from the event loop as a
+## periodically rewritten text file and/or on a local Unix
+## socket (connect and read, e.g. "socat - UNIX:path").
+##########################################################
+
+import os
+import errno
+import socket
+import collections
+
+
+BUCKETS	=	32			# Bucket i counts values below 2**i microseconds
+
+counters = collections.defaultdict(int)		# name -> count
+histograms = {}					# name -> Histogram
+
+
+################################################################################
+# Description	: Histogram of durations with power-of-two microsecond
+#		  buckets; its size never changes, whatever is recorded.
+################################################################################
+class Histogram(object):
+
+	def __init__(self):
+		self.buckets = [0] * BUCKETS
+		self.count = 0
+		self.total = 0.0
+		self.max = 0.0
+
+	def record(self, seconds):
+		us = int(seconds * 1e6)
+		i = us.bit_length() if us > 0 else 0
+		self.buckets[i if i < BUCKETS else BUCKETS - 1] += 1
+		self.count += 1
+		self.total += seconds
+		if seconds > self.max:
+			self.max = seconds
+		return
+
+	# Upper bound (seconds) of the bucket holding fraction q (0..1) of the values
+	def percentile(self, q):
+		if not self.count:
+			return 0.0
+		rank = q * self.count
+		seen = 0
+		for i in range(BUCKETS):
+			seen += self.buckets[i]
+			if seen >= rank and self.buckets[i]:
+				return min((1 << i) / 1e6, self.max)
+		return self.max
+
+
+def record (name, seconds):
+	hist = histograms.get(name)
+	if hist is None:
+		hist = histograms[name] = Histogram()
+	hist.record(seconds)
+	return
+
+
+def reset ():
+	counters.clear()
+	histograms.clear()
+	return
+
+
+################################################################################
+# Description	: Text snapshot of all the statistics.
+# Return	: One line per histogram (times in milliseconds), then one
+#		  line per counter
+################################################################################
+def snapshot ():
+	lines = ["# histogram count avg_ms p50_ms p95_ms p99_ms max_ms"]
+	for name in sorted(histograms):
+		h = histograms[name]
+		lines.append("%s %d %.3f %.3f %.3f %.3f %.3f" % (name, h.count,
+			     h.total * 1e3 / h.count if h.count else 0.0,
+			     h.percentile(0.50) * 1e3, h.percentile(0.95) * 1e3,
+			     h.percentile(0.99) * 1e3, h.max * 1e3))
+	lines.append("# counter value")
+	for name in sorted(counters):
+		lines.append("%s %d" % (name, counters[name]))
+	return "\n".join(lines) + "\n"
+
+
+################################################################################
+# Description	: Publishes snapshot() from an event loop.
+# Input		: @loop        = liftloop.EventLoop
+#		  @path        = stats file rewritten every "period" seconds,
+#				 or None
+#		  @socket_path = Unix socket which sends a snapshot to every
+#				 client that connects, or None
+#		  @period      = seconds between two rewrites of the file
+################################################################################
+class StatsExporter(object):
+
+	def __init__(self, loop, path=None, socket_path=None, period=10.0):
+		self.loop = loop
+		self.path = path
+		self.socket_path = socket_path
+		self.period = period
+		self.timer = None
+		self.sock = None
+		if path is not None:
+			self.timer = loop.callLater(period, self.flush)
+		if socket_path is not None:
+			try:
+				os.unlink(socket_path)
+			except OSError as e:
+				if e.errno != errno.ENOENT:
+					raise
+			self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+			self.sock.bind(socket_path)
+			self.sock.listen(4)
+			self.sock.setblocking(False)
+			loop.addReader(self.sock.fileno(), self._accept)
+
+	# Rewrite the stats file (atomically, through a rename)
+	def write(self):
+		tmp = self.path + ".tmp"
+		fo = open(tmp, "w")
+		fo.write(snapshot())
+		fo.close()
+		os.rename(tmp, self.path)
+		return
+
+	def flush(self):
+		self.write()
+		self.timer = self.loop.callLater(self.period, self.flush)
+		return
+
+	def _accept(self, fd, events):
+		try:
+			conn, addr = self.sock.accept()
+		except socket.error:
+			return
+		try:
+			conn.setblocking(True)
+			conn.settimeout(1.0)				# Never hold up the loop for long
+			conn.sendall(snapshot())
+		except socket.error:
+			pass
+		conn.close()
+		return
+
+	def close(self):
+		if self.timer is not None:
+			self.timer.cancel()
+			self.timer = None
+			self.write()
+		if self.sock is not None:
+			self.loop.removeReader(self.sock.fileno())
+			self.sock.close()
+			self.sock = None
+			os.unlink(self.socket_path)
+		return
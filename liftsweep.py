@@ -0,0 +1,145 @@
+#!/usr/bin/python
+##########################################################
+## Parameter sweep of the lift controller
+##
+## Runs the benchmark (liftbench) on a virtual clock for
+## every point of a grid of timings, dispatch policies
+## and traffic rates, several seeds per point, spread
+## over a pool of worker processes. The wait and ride
+## times of all the seeds of a point are merged into one
+## line of a JSON report. Each run only depends on its
+## parameters and seed, so the report is the same for
+## any number of workers.
+##
+## Usage: liftsweep.py [--policy P ...] [--rate R ...]
+##		       [--chase-hold S ...] [--floor-time S ...]
+##		       [--dwell-time S ...] [--depart-delay S ...]
+##		       [--pattern P] [--cars N] [--floors M]
+##		       [--dir-leds D] [--hours H] [--seeds K]
+##		       [--seed S] [--jobs J] [--output FILE]
+##########################################################
+
+import sys
+import json
+import time
+import argparse
+import itertools
+import multiprocessing
+
+import liftctl
+import liftboard
+import liftbench
+import lifttraffic
+
+
+# Swept timings (see liftboard.TIMING)
+TIMINGS = [
+	"chase_hold",			# Seconds per direction LED step
+	"floor_time",			# Seconds at each floor passed
+	"dwell_time",			# Door dwell at a stop
+	"depart_delay",			# Wait after a call before leaving
+]
+
+
+################################################################################
+# Description	: One run of the sweep (in a worker process).
+# Input		: @job = (point, seed) where point is the dict of the
+#			 parameters of the grid point and of the building
+# Return	: (sorted wait times, sorted ride times, result of the run)
+################################################################################
+def runJob (job):
+	point, seed = job
+	passengers = lifttraffic.generate(point["pattern"], point["rate"], point["floors"],
+					  point["hours"] * 3600, seed)
+	timing = dict((name, point[name]) for name in TIMINGS)
+	timing["chase_time"] = point["chase_hold"] * point["dir_leds"]
+	bench = liftbench.Benchmark(passengers, point["cars"], point["floors"], point["policy"], timing=timing)
+	res = bench.run()
+	return sorted(bench.waits), sorted(bench.rides), res
+
+
+################################################################################
+# Description	: Merge the runs of one grid point.
+# Input		: @point = parameters of the grid point
+#		  @runs  = list of runJob() results of its seeds
+# Return	: dict of the point and its merged statistics
+################################################################################
+def mergeRuns (point, runs):
+	waits = sorted(itertools.chain(*[run[0] for run in runs]))
+	rides = sorted(itertools.chain(*[run[1] for run in runs]))
+	merged = dict(point)
+	merged.update({
+		"runs":			len(runs),
+		"passengers":		sum(run[2]["passengers"] for run in runs),
+		"delivered":		sum(run[2]["delivered"] for run in runs),
+		"wait_avg":		sum(waits) / len(waits) if waits else 0.0,
+		"wait_p95":		liftbench.percentile(waits, 0.95),
+		"wait_p99":		liftbench.percentile(waits, 0.99),
+		"wait_max":		waits[-1] if waits else 0.0,
+		"ride_avg":		sum(rides) / len(rides) if rides else 0.0,
+		"ride_p95":		liftbench.percentile(rides, 0.95),
+		"ride_p99":		liftbench.percentile(rides, 0.99),
+		"calls_per_hour":	sum(run[2]["calls_per_hour"] for run in runs) / len(runs),
+		"floors_travelled":	sum(run[2]["floors_travelled"] for run in runs),
+	})
+	return merged
+
+
+def main (argv):
+	defaults = liftboard.TIMING
+	parser = argparse.ArgumentParser(description="Parallel parameter sweep of the lift controller")
+	parser.add_argument("--policy", action="append", help="dispatch policy, may be repeated (default: look)")
+	parser.add_argument("--rate", action="append", type=float, help="passengers per hour, may be repeated (default: 120)")
+	for name in TIMINGS:
+		parser.add_argument("--" + name.replace("_", "-"), action="append", type=float, dest=name,
+				    help="seconds, may be repeated (default: %g)" % defaults[name])
+	parser.add_argument("--pattern", default="poisson", choices=sorted(lifttraffic.PATTERNS))
+	parser.add_argument("--cars", type=int, default=1)
+	parser.add_argument("--floors", type=int, default=4)
+	parser.add_argument("--dir-leds", type=int, default=liftctl.DIR_LEDS, help="direction LEDs in one chase")
+	parser.add_argument("--hours", type=float, default=1.0, help="hours of traffic per run")
+	parser.add_argument("--seeds", type=int, default=8, help="runs per grid point")
+	parser.add_argument("--seed", type=int, default=1, help="seed of the first run of each point")
+	parser.add_argument("--jobs", type=int, default=multiprocessing.cpu_count(), help="worker processes")
+	parser.add_argument("--output", help="JSON file for the report (default: stdout)")
+	args = parser.parse_args(argv)
+
+	# Grid of points, in a fixed order
+	axes = [("policy", args.policy or ["look"]), ("rate", args.rate or [120.0])]
+	axes += [(name, getattr(args, name) or [defaults[name]]) for name in TIMINGS]
+	building = {"pattern": args.pattern, "cars": args.cars, "floors": args.floors,
+		    "dir_leds": args.dir_leds, "hours": args.hours}
+	points = []
+	for values in itertools.product(*[axis[1] for axis in axes]):
+		point = dict(building)
+		point.update(zip([axis[0] for axis in axes], values))
+		points.append(point)
+	# Every point runs the same seeds, so the points see the same traffic
+	jobs = [(point, args.seed + i) for point in points for i in range(args.seeds)]
+
+	wall = time.time()
+	if args.jobs > 1:
+		pool = multiprocessing.Pool(args.jobs)
+		results = pool.map(runJob, jobs, chunksize=1)
+		pool.close()
+		pool.join()
+	else:
+		results = map(runJob, jobs)
+	wall = time.time() - wall
+
+	report = {
+		"points":	[mergeRuns(point, results[i * args.seeds:(i + 1) * args.seeds]) for i, point in enumerate(points)],
+		"runs":		len(jobs),
+		"jobs":		args.jobs,
+		"wall_seconds":	wall,
+	}
+	out = sys.stdout if not args.output else open(args.output, "w")
+	json.dump(report, out, indent=1, sort_keys=True)
+	out.write("\n")
+	if args.output:
+		out.close()
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,67 @@
+##########################################################
+## Passenger traffic for the lift simulation
+##
+## Generates seeded streams of passengers (arrival time,
+## origin floor, destination floor) for the usual building
+## traffic patterns:
+##	poisson		- random arrivals between any floors
+##	uppeak		- morning: mostly from the ground floor up
+##	lunch		- two-way: to and from the ground floor
+##	downpeak	- evening: mostly down to the ground floor
+##########################################################
+
+import random
+
+
+# Share of passengers per trip type for each pattern:
+#	(from ground floor up, down to ground floor, between other floors)
+PATTERNS = {
+	"poisson":	None,				# Origin and destination uniformly random
+	"uppeak":	(0.85, 0.05, 0.10),
+	"lunch":	(0.40, 0.40, 0.20),
+	"downpeak":	(0.05, 0.85, 0.10),
+}
+
+
+################################################################################
+# Description	: Origin and destination of one passenger.
+# Input		: @rnd    = random.Random to draw from
+#		  @split  = trip type shares of the pattern (see PATTERNS)
+#		  @floors = number of floors (at least 2)
+# Return	: (origin, destination), always two different floors
+################################################################################
+def passengerTrip (rnd, split, floors):
+	if split is None or floors < 3:
+		origin = rnd.randrange(floors)
+		dest = rnd.randrange(floors - 1)
+		return origin, dest if dest < origin else dest + 1
+	x = rnd.random()
+	if x < split[0]:
+		return 0, rnd.randrange(1, floors)
+	if x < split[0] + split[1]:
+		return rnd.randrange(1, floors), 0
+	origin = rnd.randrange(1, floors)
+	dest = rnd.randrange(1, floors - 1)
+	return origin, dest if dest < origin else dest + 1
+
+
+################################################################################
+# Description	: Stream of passengers with Poisson arrivals.
+# Input		: @pattern  = traffic pattern (see PATTERNS)
+#		  @rate     = passengers per hour
+#		  @floors   = number of floors
+#		  @duration = seconds of traffic
+#		  @seed     = seed of the random generator; the same seed
+#			      always gives the same stream
+# Return	: List of (time, origin, destination), in time order
+################################################################################
+def generate (pattern, rate, floors, duration, seed=0):
+	split = PATTERNS[pattern]
+	rnd = random.Random(seed)
+	passengers = []
+	t = rnd.expovariate(rate / 3600.0)
+	while t < duration:
+		origin, dest = passengerTrip(rnd, split, floors)
+		passengers.append((t, origin, dest))
+		t += rnd.expovariate(rate / 3600.0)
+	return passengers
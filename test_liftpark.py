@@ -0,0 +1,104 @@
+##########################################################
+## Tests of idle parking in a group of cars
+##
+## Run with: python -m unittest test_liftpark
+##########################################################
+
+import unittest
+
+import liftloop
+import liftpark
+import liftsim
+import liftstats
+
+
+################################################################################
+# Description	: A car being parked passes a floor, the group dispatcher
+#		  hands it a hall call and the call stops the parking move
+#		  from inside the parking task itself. Parking must not make
+#		  the calls wait longer than the same traffic without it.
+################################################################################
+class GroupParkingTest(unittest.TestCase):
+
+	def setUp(self):
+		liftstats.reset()
+
+	def simulate(self, cars, floors, rate, park, hours):
+		sim = liftsim.Simulation(cars, floors, "look", park)
+		sim.schedule(liftsim.randomArrivals(rate, floors, hours * 3600))
+		sim.run()
+		return sim
+
+	def runDay(self, cars, floors, rate, park, hours):
+		unparked = self.simulate(cars, floors, rate, None, hours).summary()
+		sim = self.simulate(cars, floors, rate, park, hours)
+		res = sim.summary()
+		self.assertEqual(res["served"] + res["merged"], res["calls"])
+		for car in sim.group.cars:
+			self.assertFalse(car.calls)
+			self.assertEqual(car.direction, 0)
+		self.assertTrue(liftstats.counters["park.moves"] > 0)
+		self.assertTrue(liftstats.counters["park.cancelled"] > 0)
+		self.assertEqual(res["calls"], unparked["calls"])
+		self.assertTrue(res["avg_wait"] <= unparked["avg_wait"],
+				"parking raised the average wait from %.2f s to %.2f s" % (unparked["avg_wait"], res["avg_wait"]))
+		return res
+
+	def testOneCar(self):
+		self.runDay(1, 10, 30.0, 30.0, 24)
+
+	def testTwoCars(self):
+		self.runDay(2, 6, 30.0, 30.0, 24)
+
+	def testThreeCars(self):
+		self.runDay(3, 12, 60.0, 30.0, 24)
+
+	def testBusyGroup(self):
+		self.runDay(4, 20, 400.0, 20.0, 2)
+
+	# Hall calls moved to another car are counted once in the demand
+	def testDemandOncePerCall(self):
+		sim = liftsim.Simulation(4, 20, "look", 20.0)
+		sim.model.decay = 1.0
+		sim.schedule(liftsim.randomArrivals(400.0, 20, 2 * 3600))
+		sim.run()
+		total = sum(sum(row) for row in sim.model.counts)
+		self.assertEqual(total, sim.calls - sim.merged)
+
+
+class DemandModelTest(unittest.TestCase):
+
+	# Cars of a group get distinct floors, also when the calls come from one floor
+	def testSpread(self):
+		model = liftpark.DemandModel(10)
+		for i in range(20):
+			model.record(9, 0.0)
+		self.assertEqual(model.spread(0.0, 3), [7, 8, 9])
+		for i in range(60):
+			model.record(i % 10, 0.0)
+		floors = model.spread(0.0, 4)
+		self.assertEqual(floors, sorted(set(floors)))
+		self.assertEqual(model.best(0.0), model.spread(0.0, 1)[0])
+		self.assertEqual(model.spread(3600.0, 2), None)		# No calls in that hour yet
+
+
+class TaskCancelTest(unittest.TestCase):
+
+	# A task cancelled by its own coroutine stops at its next yield
+	def testCancelFromInside(self):
+		loop = liftloop.SimLoop()
+		steps = []
+		def coro():
+			steps.append(1)
+			task.cancel()
+			yield 1.0
+			steps.append(2)
+		task = loop.spawn(coro())
+		loop.run()
+		self.assertEqual(steps, [1])
+		self.assertTrue(task.done)
+		self.assertFalse(task.stack)
+
+
+if __name__ == "__main__":
+	unittest.main()
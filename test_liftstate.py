@@ -0,0 +1,88 @@
+##########################################################
+## Tests of the crash-safe state log
+##
+## Run with: python -m unittest test_liftstate
+##########################################################
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import liftctl
+import liftloop
+import liftstate
+
+
+################################################################################
+# Description	: Loading hand-written logs, compaction and a restart round
+#		  trip through a car.
+################################################################################
+class StateStoreTest(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.path = os.path.join(self.dir, "state")
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def write(self, data):
+		fo = open(self.path, "w")
+		fo.write(data)
+		fo.close()
+		return
+
+	def load(self, data):
+		self.write(data)
+		return liftstate.StateStore(self.path).load()
+
+	def testMissingFile(self):
+		self.assertEqual(liftstate.StateStore(self.path).load(), None)
+
+	def testTornRecord(self):
+		saved = self.load("F 2 1\nC 3\nC 1\nF 3")
+		self.assertEqual(saved, {"floor": 2, "direction": 1, "pending": [3, 1]})
+
+	def testGarbageRecords(self):
+		saved = self.load("F 2 1\nC 3\nC x\nF\nZ 1\nD up\n\nC 0\n")
+		self.assertEqual(saved, {"floor": 2, "direction": 1, "pending": [3, 0]})
+
+	def testNoFloor(self):
+		self.assertEqual(self.load("C 3\nD 1\n"), None)
+
+	def testServeNotPending(self):
+		saved = self.load("F 0 0\nC 2\nS 3\nS 2\nS 2\nC 1\n")
+		self.assertEqual(saved["pending"], [1])
+
+	def testCompaction(self):
+		loop = liftloop.SimLoop()
+		car = liftctl.LiftController(loop, liftctl.NullOutputs(), floor=1)
+		store = liftstate.StateStore(self.path, compact_every=4)
+		store.open(car)
+		for floor in (2, 3, 0):
+			store.append("C %d" % floor)
+		self.assertEqual(open(self.path).read().count("\n"), 4)
+		store.append("S 3")					# 4th append: the log is compacted
+		store.close()
+		self.assertEqual(store.records, 0)
+		self.assertEqual(open(self.path).read(), "F 1 0\nC 2\nC 0\n")
+		self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+	def testRoundTrip(self):
+		saved = self.load("F 0 1\nC 3\nC 1\nC 2\nF 1 1\nS 1\nD -1\n")
+		loop = liftloop.SimLoop()
+		car = liftctl.LiftController(loop, liftctl.NullOutputs(), floor=saved["floor"])
+		car.direction = saved["direction"]
+		for floor in saved["pending"]:
+			car.calls.add(floor)
+		store = liftstate.StateStore(self.path)
+		store.open(car)
+		store.close()
+		again = liftstate.StateStore(self.path).load()
+		self.assertEqual(again, {"floor": 1, "direction": -1, "pending": [3, 2]})
+		self.assertEqual(again, saved)
+
+
+if __name__ == "__main__":
+	unittest.main()